@@ -0,0 +1,263 @@
+"""
+Benchmarks for the mod manager's core operations on synthetic game directories.
+
+    python bench.py                                  # 100, 1000 and 5000 packs, results as JSON on stdout
+    python bench.py --sizes 100,20000 --png 0.5 --zip-mb 2048 --workshop 5000 --output bench.json
+    python bench.py --save-baseline bench_baseline.json
+    python bench.py --baseline bench_baseline.json   # exit code 1 if something got slower
+
+Everything is generated in a temporary directory: data/ with N synthetic PFH5 packs (and optional .png
+previews), a user.script.txt listing every mod plus filler lines, a large .pack for add_pack_file, a zip
+archive of the requested size for add_zip_archive and a Workshop-style folder with one pack per item.
+"""
+import os
+import sys
+import json
+import time
+import struct
+import shutil
+import zipfile
+import argparse
+import platform
+import statistics
+import tempfile
+import threading
+import types
+
+import main as mm
+
+CHUNK = b"\x5a" * (1024 * 1024)
+
+
+# ------------- synthetic data ---------------
+
+def synthetic_loc(entries):
+    data = b"\xff\xfeLOC\x00" + struct.pack("<iI", 1, len(entries))
+    for key, text in entries:
+        for field in (key, text):
+            data += struct.pack("<H", len(field)) + field.encode("utf-16-le")
+        data += b"\x00"
+    return data
+
+def synthetic_pack_bytes(files):
+    """PFH5 mod pack (no timestamps, nothing compressed) with the given (name, bytes) entries."""
+    index = b""
+    payload = b""
+    for name, content in files:
+        index += struct.pack("<IB", len(content), 0) + name.encode("utf-8") + b"\x00"
+        payload += content
+    header = mm.PFH_HEADER.pack(b"PFH5", 3, 0, 0, len(files), len(index), 0)
+    return header + index + payload
+
+def write_big_file(path, size_mb):
+    with open(path, "wb") as f:
+        for _ in range(size_mb):
+            f.write(CHUNK)
+
+def make_game_dir(root, n_packs, png_ratio=0.0):
+    game = os.path.join(root, f"game_{n_packs}")
+    data = os.path.join(game, "data")
+    os.makedirs(data, exist_ok=True)
+    names = []
+    for i in range(n_packs):
+        name = f"synthetic_mod_{i:05d}.pack"
+        files = [
+            (f"db\\units_tables\\synthetic_{i}", struct.pack("<I", i) * 16),
+            (f"text\\db\\synthetic_{i}.loc", synthetic_loc([(f"mct_synthetic_{i}_mod_title", f"Synthetic Mod {i}")])),
+        ]
+        with open(os.path.join(data, name), "wb") as f:
+            f.write(synthetic_pack_bytes(files))
+        if png_ratio and (i % max(1, round(1 / png_ratio))) == 0:
+            with open(os.path.join(data, name[:-5] + ".png"), "wb") as f:
+                f.write(b"\x89PNG\r\n\x1a\n" + b"\x00" * 256)
+        names.append(name)
+    return game, names
+
+def make_scripts(root, names, script_filler):
+    scripts = os.path.join(root, "scripts")
+    os.makedirs(scripts, exist_ok=True)
+    user_script = os.path.join(scripts, "user.script.txt")
+    with open(user_script, "w", encoding="utf-8") as f:
+        for i in range(script_filler):
+            f.write(f"-- filler line {i}\n")
+        for name in names:
+            f.write(f'mod "{name}";\n')
+    return scripts
+
+def make_workshop(root, n_items):
+    workshop = os.path.join(root, "workshop", "content", mm.WORKSHOP_APP_ID)
+    for i in range(n_items):
+        item = os.path.join(workshop, str(1000000 + i))
+        os.makedirs(item)
+        name = f"workshop_mod_{i:05d}"
+        with open(os.path.join(item, name + ".pack"), "wb") as f:
+            f.write(synthetic_pack_bytes([(f"db\\units_tables\\workshop_{i}", struct.pack("<I", i) * 16)]))
+        with open(os.path.join(item, name + ".png"), "wb") as f:
+            f.write(b"\x89PNG\r\n\x1a\n")
+    return workshop
+
+def make_zip(root, size_mb):
+    src = os.path.join(root, "zip_payload.pack")
+    write_big_file(src, size_mb)
+    zip_path = os.path.join(root, "archive.zip")
+    with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as z:
+        z.write(src, "archive_mod/zipped_mod.pack")
+        z.writestr("archive_mod/zipped_mod.png", b"\x89PNG\r\n\x1a\n")
+    os.remove(src)
+    return zip_path
+
+
+# ------------- timing ---------------
+
+def timed(fn, repeat, setup=None):
+    runs = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        t0 = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - t0)
+    return {"min": min(runs), "median": statistics.median(runs), "runs": runs}
+
+def use_scripts_dir(scripts):
+    mm.get_user_script_path = lambda scripts_dir=None: os.path.join(scripts_dir or scripts, "user.script.txt")
+    mm.get_active_mods_path = lambda scripts_dir=None: os.path.join(scripts_dir or scripts, "active_mods.script")
+
+def bench_page():
+    """Minimal stand-in for ft.Page: enough for main() to build the UI without a Flet session."""
+    page = types.SimpleNamespace()
+    page.window = types.SimpleNamespace()
+    page.window_height = 600
+    page.add = lambda *controls: None
+    page.update = lambda *a: None
+    page.get_control = lambda _id: None
+    return page
+
+def no_watcher(dirs, on_change, debounce=None):
+    return types.SimpleNamespace(stop=lambda: None)
+
+def wait_background_threads(timeout=60):
+    for t in threading.enumerate():
+        if t is not threading.current_thread() and t.daemon:
+            t.join(timeout)
+
+def run(args):
+    results = {}
+    mm.start_watcher = no_watcher   # the watcher thread would only add noise to the timings
+    root = tempfile.mkdtemp(prefix="wh2mm_bench_")
+    cwd = os.getcwd()
+    try:
+        os.chdir(root)
+        mm.PACK_CACHE_FILE = os.path.join(root, "pack_cache.json")
+        big_pack = os.path.join(root, "big_mod.pack")
+        write_big_file(big_pack, args.pack_mb)
+        zip_path = make_zip(root, args.zip_mb)
+
+        if args.workshop:
+            workshop = make_workshop(root, args.workshop)
+            mm.scan_mod_sources([workshop])   # the first scan fills the per-item cache
+            results[f"scan_mod_sources.warm[{args.workshop}]"] = timed(
+                lambda: mm.scan_mod_sources([workshop]), args.repeat)
+
+        for n in args.sizes:
+            game, names = make_game_dir(root, n, args.png)
+            scripts = make_scripts(os.path.join(root, f"scripts_{n}"), names, args.script_lines)
+            use_scripts_dir(scripts)
+            active = os.path.join(scripts, "active_mods.script")
+
+            def drop_active():
+                if os.path.exists(active):
+                    os.remove(active)
+
+            results[f"scan_mods[{n}]"] = timed(lambda: mm.scan_mods(game), args.repeat)
+            results[f"read_active_mods_file.bootstrap[{n}]"] = timed(mm.read_active_mods_file, args.repeat, drop_active)
+            results[f"read_active_mods_file[{n}]"] = timed(mm.read_active_mods_file, args.repeat)
+            order = mm.read_active_mods_file()
+            results[f"sync_active_into_user_script[{n}]"] = timed(
+                lambda: mm.sync_active_into_user_script(order), args.repeat)
+
+            if n == args.sizes[0]:
+                # copy/extract cost does not depend on the collection size, measure it once
+                dest_pack = os.path.join(game, "data", os.path.basename(big_pack))
+
+                def drop_pack():
+                    if os.path.exists(dest_pack):
+                        os.remove(dest_pack)
+
+                results[f"add_pack_file[{args.pack_mb}MB]"] = timed(
+                    lambda: mm.add_pack_file(big_pack, game), args.repeat, drop_pack)
+                results[f"add_zip_archive[{args.zip_mb}MB]"] = timed(
+                    lambda: mm.add_zip_archive(zip_path, game), args.repeat)
+                for extra in ("big_mod.pack", "zipped_mod.pack", "zipped_mod.png"):
+                    p = os.path.join(game, "data", extra)
+                    if os.path.exists(p):
+                        os.remove(p)
+
+            with open(os.path.join(root, mm.CONFIG_FILE), "w", encoding="utf-8") as f:
+                json.dump({"game_path": game}, f)
+            results[f"mod_list_build[{n}]"] = timed(lambda: mm.main(bench_page()), args.repeat)
+            wait_background_threads()
+            shutil.rmtree(game, ignore_errors=True)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(root, ignore_errors=True)
+    return {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("baseline", "save_baseline", "output")},
+        },
+        "results": results,
+    }
+
+def compare(report, baseline, tolerance, min_delta):
+    """List of (name, baseline_median, median) that got slower than tolerance allows."""
+    regressions = []
+    for name, cur in report["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        if cur["median"] > base["median"] * (1 + tolerance) and cur["median"] - base["median"] > min_delta:
+            regressions.append((name, base["median"], cur["median"]))
+    return regressions
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default="100,1000,5000",
+                    type=lambda v: [int(x) for x in v.split(",") if x], help="pack counts (e.g. 100,20000)")
+    ap.add_argument("--png", type=float, default=0.0, help="fraction of packs that get a .png preview")
+    ap.add_argument("--script-lines", type=int, default=5000, help="filler lines in user.script.txt")
+    ap.add_argument("--pack-mb", type=int, default=64, help="size of the pack used for add_pack_file")
+    ap.add_argument("--zip-mb", type=int, default=64, help="size of the zip used for add_zip_archive")
+    ap.add_argument("--workshop", type=int, default=1500, help="Workshop items for scan_mod_sources (0 = skip)")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--output", help="write the JSON report here instead of stdout")
+    ap.add_argument("--baseline", help="compare against this report; exit code 1 on regressions")
+    ap.add_argument("--save-baseline", help="also store the report as the new baseline")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = +25%%)")
+    ap.add_argument("--min-delta", type=float, default=0.002, help="ignore slowdowns smaller than this (seconds)")
+    args = ap.parse_args(argv)
+
+    report = run(args)
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            f.write(payload + "\n")
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance, args.min_delta)
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: {before * 1000:.1f} ms -> {after * 1000:.1f} ms", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,28 @@
 import os
+import re
+import sys
 import json
+import time
+import asyncio
+import select
+import struct
+import ctypes
+import ctypes.util
+import lzma
+import mmap
+import gzip
+import difflib
+import hashlib
+import hmac
+import secrets
+import atexit
+import argparse
+import functools
+import threading
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from collections import namedtuple, deque
+from contextlib import contextmanager
 import flet as ft
 import tkinter as tk
 from tkinter import filedialog
@@ -10,19 +32,145 @@ import tempfile
 
 CONFIG_FILE = "config.json"
 STANDARD_PACKS_FILE = "assets/standard_packs.txt"
+PACK_CACHE_FILE = "pack_cache.json"
+DB_KEYS_CACHE_FILE = "db_keys_cache.json"
+DB_SCHEMA_FILE = "assets/db_schema.json"
 
 
+# ------------- tracing ---------------
+# Off by default (enable with --trace / WH2MM_TRACE). When off, a traced call costs one attribute check.
+
+class Tracer:
+    """
+    In-process latency instrumentation: every span records wall time and the I/O done inside it
+    (bytes read/written, files stat'ed, UI controls created) into per-name histograms and an event log.
+    """
+
+    COUNTERS = ("bytes_read", "bytes_written", "stats", "controls")
+    MAX_EVENTS = 100000
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._origin = time.perf_counter()
+        self._events = deque(maxlen=self.MAX_EVENTS)
+        self._hist = {}   # name -> {"count", "total_us", "max_us", "buckets": {log2(us): n}, counters...}
+        self.output = ("trace.json", "json")   # where --trace / the debug panel write to
+
+    def count(self, counter, n=1):
+        """Add n to counter of every open span on this thread."""
+        for frame in getattr(self._local, "stack", ()):
+            frame[counter] += n
+
+    @contextmanager
+    def span(self, name):
+        if not self.enabled:
+            yield
+            return
+        stack = self._local.__dict__.setdefault("stack", [])
+        frame = dict.fromkeys(self.COUNTERS, 0)
+        stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            dur_us = (time.perf_counter() - start) * 1e6
+            stack.pop()
+            self._record(name, start, dur_us, frame)
+
+    def _record(self, name, start, dur_us, frame):
+        with self._lock:
+            h = self._hist.get(name)
+            if h is None:
+                h = self._hist[name] = dict({"count": 0, "total_us": 0.0, "max_us": 0.0, "buckets": {}},
+                                            **dict.fromkeys(self.COUNTERS, 0))
+            h["count"] += 1
+            h["total_us"] += dur_us
+            h["max_us"] = max(h["max_us"], dur_us)
+            bucket = int(dur_us).bit_length()   # 2**(b-1) <= us < 2**b
+            h["buckets"][bucket] = h["buckets"].get(bucket, 0) + 1
+            for c in self.COUNTERS:
+                h[c] += frame[c]
+            self._events.append((name, (start - self._origin) * 1e6, dur_us, threading.get_ident(), frame))
+
+    def reset(self):
+        with self._lock:
+            self._events.clear()
+            self._hist.clear()
+
+    @staticmethod
+    def _percentile(buckets, count, q):
+        """Upper bound (ms) of the histogram bucket holding the q-th quantile."""
+        seen = 0
+        for bucket in sorted(buckets):
+            seen += buckets[bucket]
+            if seen >= q * count:
+                return (1 << bucket) / 1000.0
+        return 0.0
+
+    def summary(self):
+        with self._lock:
+            out = {}
+            for name, h in sorted(self._hist.items()):
+                out[name] = {
+                    "count": h["count"],
+                    "mean_ms": h["total_us"] / h["count"] / 1000.0,
+                    "p50_ms": self._percentile(h["buckets"], h["count"], 0.5),
+                    "p99_ms": self._percentile(h["buckets"], h["count"], 0.99),
+                    "max_ms": h["max_us"] / 1000.0,
+                    "histogram_us": {f"<{1 << b}": n for b, n in sorted(h["buckets"].items())},
+                }
+                out[name].update({c: h[c] for c in self.COUNTERS})
+            return out
+
+    def chrome_trace(self):
+        """Events in Chrome trace format (load in chrome://tracing or Perfetto)."""
+        pid = os.getpid()
+        with self._lock:
+            events = [{"name": name, "ph": "X", "ts": round(ts, 1), "dur": round(dur, 1), "pid": pid, "tid": tid,
+                       "args": frame} for name, ts, dur, tid, frame in self._events]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump(self, path, fmt="json"):
+        payload = self.chrome_trace() if fmt == "chrome" else {"histograms": self.summary()}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=1)
+
+TRACER = Tracer()
+
+def traced(name):
+    """Decorator: run the function inside a TRACER span called name."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not TRACER.enabled:
+                return fn(*args, **kwargs)
+            with TRACER.span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
 # ------------- helpers / file paths ---------------
 
 def load_config():
+    return load_settings().get("game_path")
+
+def load_settings():
+    """Whole config.json as a dict (game_path plus optional settings such as warmup_budget_mb)."""
     if os.path.exists(CONFIG_FILE):
         with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-            return json.load(f).get("game_path")
-    return None
+            return json.load(f)
+    return {}
 
-def save_config(path):
+def save_settings(settings):
     with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-        json.dump({"game_path": path}, f, indent=4)
+        json.dump(settings, f, indent=4)
+
+def save_config(path):
+    settings = load_settings()
+    settings["game_path"] = path
+    save_settings(settings)
 
 def select_game_folder():
     root = tk.Tk()
@@ -33,12 +181,63 @@ def select_game_folder():
     root.destroy()
     return path if path else None
 
-def get_user_script_path():
-    return os.path.expandvars(r"%APPDATA%\The Creative Assembly\Warhammer2\scripts\user.script.txt")
+DEFAULT_SCRIPTS_DIR = r"%APPDATA%\The Creative Assembly\Warhammer2\scripts"
+_active_scripts_dir = None   # scripts folder of the selected install; None = DEFAULT_SCRIPTS_DIR
+
+def use_install(install):
+    """Make the script helpers default to this install's scripts folder (install dict or None)."""
+    global _active_scripts_dir
+    _active_scripts_dir = (install or {}).get("scripts_dir") or None
+
+def select_folder(title, initial=None):
+    root = tk.Tk()
+    root.withdraw()
+    root.lift()
+    root.attributes("-topmost", True)
+    path = filedialog.askdirectory(title=title, initialdir=initial or None)
+    root.destroy()
+    return path if path else None
+
+def select_file(title, filetypes, save_as=None):
+    """Open dialog, or a save dialog proposing save_as as the file name."""
+    root = tk.Tk()
+    root.withdraw()
+    root.lift()
+    root.attributes("-topmost", True)
+    if save_as:
+        path = filedialog.asksaveasfilename(title=title, filetypes=filetypes, initialfile=save_as)
+    else:
+        path = filedialog.askopenfilename(title=title, filetypes=filetypes)
+    root.destroy()
+    return path if path else None
+
+def get_user_script_path(scripts_dir=None):
+    return os.path.join(os.path.expandvars(scripts_dir or _active_scripts_dir or DEFAULT_SCRIPTS_DIR), "user.script.txt")
+
+def get_active_mods_path(scripts_dir=None):
+    return os.path.join(os.path.expandvars(scripts_dir or _active_scripts_dir or DEFAULT_SCRIPTS_DIR), "active_mods.script")
 
-def get_active_mods_path():
-    return os.path.expandvars(r"%APPDATA%\The Creative Assembly\Warhammer2\scripts\active_mods.script")
+def get_scripts_dir(scripts_dir=None):
+    return os.path.dirname(os.path.abspath(get_user_script_path(scripts_dir)))
 
+# (size, mtime_ns) of files right after we wrote them, so the watcher can tell our writes from foreign ones
+_own_writes = {}
+
+def remember_own_write(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return
+    _own_writes[os.path.abspath(path)] = (st.st_size, st.st_mtime_ns)
+
+def is_own_write(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    return _own_writes.get(os.path.abspath(path)) == (st.st_size, st.st_mtime_ns)
+
+@traced("io.safe_write_lines")
 def safe_write_lines(path, lines):
     """Atomic write (temp -> replace)."""
     dirn = os.path.dirname(path)
@@ -48,6 +247,28 @@ def safe_write_lines(path, lines):
         with os.fdopen(fd, "w", encoding="utf-8") as f:
             for ln in lines:
                 f.write(ln + "\n")
+            if TRACER.enabled:
+                TRACER.count("bytes_written", f.tell())
+        os.replace(tmp, path)
+    except Exception:
+        try:
+            os.remove(tmp)
+        except Exception:
+            pass
+        raise
+    remember_own_write(path)
+
+@traced("io.safe_write_bytes")
+def safe_write_bytes(path, data):
+    """Atomic binary write (temp -> replace)."""
+    dirn = os.path.dirname(path)
+    os.makedirs(dirn, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=dirn)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        if TRACER.enabled:
+            TRACER.count("bytes_written", len(data))
         os.replace(tmp, path)
     except Exception:
         try:
@@ -56,11 +277,15 @@ def safe_write_lines(path, lines):
             pass
         raise
 
+@traced("io.read_lines")
 def read_lines(path):
     if not os.path.exists(path):
         return []
     with open(path, "r", encoding="utf-8") as f:
-        return [ln.rstrip("\n") for ln in f.readlines()]
+        lines = f.readlines()
+    if TRACER.enabled:
+        TRACER.count("bytes_read", sum(len(ln) for ln in lines))
+    return [ln.rstrip("\n") for ln in lines]
 
 # ------------- standard packs and scanning ---------------
 
@@ -70,8 +295,12 @@ def load_standard_packs(file_path=STANDARD_PACKS_FILE):
     with open(file_path, "r", encoding="utf-8") as f:
         return [line.strip() for line in f.readlines()]
 
-def scan_mods(game_path):
-    """Return list of tuples: (pack_filename, png_path_or_None). Ignores STANDARD_PACKS_FILE entries."""
+@traced("io.scan_mods")
+def scan_mods(game_path, external=None):
+    """
+    Return list of tuples: (pack_filename, png_path_or_None). Ignores STANDARD_PACKS_FILE entries.
+    Locations of mods outside data/ go to external (default: the registry used by mod_path).
+    """
     data_path = os.path.join(game_path, "data")
     if not os.path.exists(data_path):
         return []
@@ -85,47 +314,551 @@ def scan_mods(game_path):
         name_no_ext = os.path.splitext(fname)[0]
         png_path = os.path.join(data_path, name_no_ext + ".png")
         mods.append((fname, png_path if os.path.exists(png_path) else None))
+    if TRACER.enabled:
+        TRACER.count("stats", len(mods))
+    mods.extend(register_external_mods(game_path, mods, standard_files, external))
     mods.sort(key=lambda x: x[0].lower())
     return mods
 
+@traced("io.scan_mod_entries")
+def scan_mod_entries(game_path, names):
+    """
+    Like scan_mods, but only for the given data/ file names (.pack or .png).
+    Returns (present, missing): present maps pack_filename -> png_path_or_None,
+    missing is a set of pack filenames that are no longer there.
+    """
+    data_path = os.path.join(game_path, "data")
+    standard_files = set(load_standard_packs())
+    packs = set()
+    for fname in names:
+        low = fname.lower()
+        if low.endswith(".pack"):
+            packs.add(fname)
+        elif low.endswith(".png"):
+            packs.add(os.path.splitext(fname)[0] + ".pack")
+    present = {}
+    missing = set()
+    for fname in packs:
+        if fname in standard_files:
+            continue
+        if not os.path.isfile(os.path.join(data_path, fname)):
+            missing.add(fname)
+            continue
+        png_path = os.path.join(data_path, os.path.splitext(fname)[0] + ".png")
+        present[fname] = png_path if os.path.exists(png_path) else None
+    if TRACER.enabled:
+        TRACER.count("stats", len(packs) + len(present))
+    return present, missing
+
+# ------------- pack format (PFH4 / PFH5) ---------------
+
+PackEntry = namedtuple("PackEntry", "name offset size compressed")
+PackIndex = namedtuple("PackIndex", "magic flags file_size data_offset entries")
+
+PFH_HAS_EXTENDED_HEADER = 0x0100
+PFH_HAS_ENCRYPTED_INDEX = 0x0080
+PFH_HAS_INDEX_WITH_TIMESTAMPS = 0x0040
+PFH_HAS_ENCRYPTED_DATA = 0x0010
+PFH_HEADER = struct.Struct("<4sIIIIII")  # magic, flags, deps count/size, files count/size, timestamp
+
+@traced("io.read_pack_index")
+def read_pack_index(pack_path):
+    """
+    Parse header and file index of a PFH4/PFH5 pack without touching the payload.
+    Raises ValueError for files that are not readable packs.
+    """
+    with open(pack_path, "rb") as f:
+        file_size = os.fstat(f.fileno()).st_size
+        head = f.read(PFH_HEADER.size)
+        if len(head) < PFH_HEADER.size:
+            raise ValueError("truncated header")
+        magic, flags, _deps_count, deps_size, files_count, index_size, _ts = PFH_HEADER.unpack(head)
+        if magic not in (b"PFH4", b"PFH5"):
+            raise ValueError(f"unsupported pack format {magic!r}")
+        if flags & PFH_HAS_ENCRYPTED_INDEX:
+            raise ValueError("encrypted index")
+        header_size = PFH_HEADER.size + (20 if magic == b"PFH5" and flags & PFH_HAS_EXTENDED_HEADER else 0)
+        data_offset = header_size + deps_size + index_size
+        if data_offset > file_size:
+            raise ValueError("index runs past end of file")
+        f.seek(header_size + deps_size)
+        index = f.read(index_size)
+    if TRACER.enabled:
+        TRACER.count("stats")
+        TRACER.count("bytes_read", len(head) + len(index))
+
+    has_ts = bool(flags & PFH_HAS_INDEX_WITH_TIMESTAMPS)
+    has_compression = magic == b"PFH5"
+    entries = []
+    pos = 0
+    offset = data_offset
+    for _ in range(files_count):
+        try:
+            (size,) = struct.unpack_from("<I", index, pos)
+        except struct.error:
+            raise ValueError("truncated index") from None
+        pos += 4 + (4 if has_ts else 0)
+        compressed = False
+        if has_compression:
+            compressed = bool(index[pos]) if pos < len(index) else False
+            pos += 1
+        end = index.find(b"\0", pos)
+        if end < 0:
+            raise ValueError("truncated index")
+        name = index[pos:end].decode("utf-8", errors="replace")
+        pos = end + 1
+        entries.append(PackEntry(name, offset, size, compressed))
+        offset += size
+    return PackIndex(magic.decode("ascii"), flags, file_size, data_offset, entries)
+
+def read_pack_entry(f, pack_index, entry):
+    """Return the (decompressed) contents of one entry from an open pack file."""
+    if pack_index.flags & PFH_HAS_ENCRYPTED_DATA:
+        raise ValueError("encrypted data")
+    f.seek(entry.offset)
+    data = f.read(entry.size)
+    if entry.compressed:
+        # PFH5: u32 uncompressed size + LZMA1 stream without the 8-byte size field
+        if len(data) < 9:
+            raise ValueError(f"truncated compressed entry {entry.name}")
+        size = struct.unpack_from("<I", data)[0]
+        data = lzma.decompress(data[4:9] + struct.pack("<Q", size) + data[9:], format=lzma.FORMAT_ALONE)
+    return data
+
+def parse_loc(data):
+    """Decode a .loc file into a list of (key, text) pairs."""
+    if data[:2] != b"\xff\xfe" or data[2:5] != b"LOC":
+        raise ValueError("not a loc file")
+    _version, count = struct.unpack_from("<iI", data, 6)
+    pos = 14
+    out = []
+    for _ in range(count):
+        fields = []
+        for _f in range(2):
+            (n,) = struct.unpack_from("<H", data, pos)
+            pos += 2
+            fields.append(data[pos:pos + n * 2].decode("utf-16-le", errors="replace"))
+            pos += n * 2
+        pos += 1  # tooltip flag
+        out.append((fields[0], fields[1]))
+    return out
+
+# loc keys mod authors use for a human-readable mod title (MCT convention and similar)
+DISPLAY_NAME_LOC_SUFFIXES = ("_mod_title", "_mod_name")
+
+@traced("io.read_pack_display_name")
+def read_pack_display_name(pack_path):
+    """Human-readable title from the pack's localisation files, or None."""
+    try:
+        idx = read_pack_index(pack_path)
+        with open(pack_path, "rb") as f:
+            for entry in idx.entries:
+                if not entry.name.lower().endswith(".loc"):
+                    continue
+                for key, text in parse_loc(read_pack_entry(f, idx, entry)):
+                    if text and key.lower().endswith(DISPLAY_NAME_LOC_SUFFIXES):
+                        return text.strip()
+    except (OSError, ValueError, struct.error, lzma.LZMAError):
+        return None
+    return None
+
+# Categories from the paths in the pack index; a pack with nothing but text\ files is "localisation".
+MOD_CATEGORIES = ("db", "scripts", "ui", "maps", "models", "audio", "localisation", "other")
+CATEGORY_FOLDERS = {
+    "db": "db",
+    "script": "scripts",
+    "ui": "ui",
+    "terrain": "maps",
+    "prefabs": "maps",
+    "variantmeshes": "models",
+    "animations": "models",
+    "models": "models",
+    "audio": "audio",
+    "text": "text",
+}
+CATEGORY_EXTENSIONS = {".rigid_model_v2": "models", ".wsmodel": "models", ".dds": "models"}
+
+def classify_pack(pack_path):
+    """Sorted list of MOD_CATEGORIES that the pack's files fall into ([] if the index cannot be read)."""
+    try:
+        idx = read_pack_index(pack_path)
+    except (OSError, ValueError):
+        return []
+    found = set()
+    for entry in idx.entries:
+        path = entry.name.lower().replace("/", "\\")
+        category = CATEGORY_FOLDERS.get(path.split("\\", 1)[0])
+        if category is None:
+            category = CATEGORY_EXTENSIONS.get(os.path.splitext(path)[1], "other")
+        found.add(category)
+    if found == {"text"}:
+        return ["localisation"]
+    found.discard("text")
+    return sorted(found, key=MOD_CATEGORIES.index)
+
+PACK_WORKERS = os.cpu_count() or 4   # default pool size for the per-pack helpers below
+
+@traced("io.classify_packs")
+def classify_packs(pack_paths, workers=None):
+    """{path: categories} through cached_pack_info; uncached packs are read on a thread pool."""
+    def classify(path):
+        try:
+            return path, cached_pack_info(path, "categories", classify_pack)
+        except OSError:
+            return path, []
+    with ThreadPoolExecutor(max_workers=workers or PACK_WORKERS) as pool:
+        return dict(pool.map(classify, pack_paths))
+
+# ------------- per-pack cache ---------------
+
+class PackInfoCache:
+    """
+    Per-pack values in a JSON file, keyed by path and valid while (size, mtime) match, so a rescan
+    only reads new or changed packs.
+    file_name() is looked up on every load and save, so the module constant can be redirected (bench.py).
+    """
+
+    def __init__(self, file_name):
+        self._file_name = file_name
+        self._data = None
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()   # snapshot + write as one step: an older snapshot never lands last
+
+    def _load(self):
+        if self._data is None:
+            try:
+                with open(self._file_name(), "r", encoding="utf-8") as f:
+                    self._data = json.load(f)
+            except (OSError, ValueError):
+                self._data = {}
+        return self._data
+
+    def get(self, pack_path, field, compute):
+        """The cached field of pack_path, or compute(pack_path) if it has none yet."""
+        key = os.path.normcase(os.path.abspath(pack_path))
+        st = os.stat(pack_path)
+        if TRACER.enabled:
+            TRACER.count("stats")
+        with self._lock:
+            entry = self._load().get(key)
+            if entry and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime_ns and field in entry:
+                return entry[field]
+        value = compute(pack_path)
+        with self._lock:
+            entry = self._data.get(key)
+            if not (entry and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime_ns):
+                entry = self._data[key] = {"size": st.st_size, "mtime": st.st_mtime_ns}
+            entry[field] = value
+            self._dirty = True
+        return value
+
+    def keys(self):
+        with self._lock:
+            return list(self._load())
+
+    def drop(self, keys):
+        with self._lock:
+            data = self._load()
+            for key in keys:
+                if data.pop(key, None) is not None:
+                    self._dirty = True
+
+    def save(self):
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                payload = json.dumps(self._data, ensure_ascii=False)
+                self._dirty = False
+            try:
+                safe_write_lines(os.path.abspath(self._file_name()), [payload])
+            except OSError:
+                with self._lock:
+                    self._dirty = True   # try again with the next save
+                raise
+
+_pack_cache = PackInfoCache(lambda: PACK_CACHE_FILE)
+
+def cached_pack_info(pack_path, field, compute):
+    """_pack_cache.get: field of pack_path, kept in PACK_CACHE_FILE."""
+    return _pack_cache.get(pack_path, field, compute)
+
+def pack_cache_keys():
+    return _pack_cache.keys()
+
+def drop_pack_cache_entries(keys):
+    """Forget cached values of packs that no longer exist (saved with the next save_pack_cache)."""
+    _pack_cache.drop(keys)
+
+@traced("io.save_pack_cache")
+def save_pack_cache():
+    _pack_cache.save()
+
+# ------------- integrity check ---------------
+# Truncated downloads and half-extracted packs otherwise only show up as game crashes.
+
+def verify_pack(pack_path):
+    """None if header, index and entry offsets are consistent with the file, otherwise a short reason."""
+    with open(pack_path, "rb") as f:
+        head = f.read(PFH_HEADER.size)
+    if len(head) < PFH_HEADER.size:
+        return "truncated header"
+    magic, flags, _deps_count, _deps_size, _files_count, index_size, _ts = PFH_HEADER.unpack(head)
+    if magic not in (b"PFH4", b"PFH5"):
+        return f"unsupported pack format {magic!r}"
+    if flags & PFH_HAS_ENCRYPTED_INDEX:
+        return None   # nothing more can be checked without the keys
+    try:
+        idx = read_pack_index(pack_path)
+    except ValueError as ex:
+        return str(ex)
+    per_entry = 4 + (4 if flags & PFH_HAS_INDEX_WITH_TIMESTAMPS else 0) + (1 if magic == b"PFH5" else 0) + 1
+    if sum(per_entry + len(e.name.encode("utf-8")) for e in idx.entries) != index_size:
+        return "index size does not match its entries"
+    for e in idx.entries:
+        if e.offset + e.size > idx.file_size:
+            return f"{e.name}: data runs past end of file"
+        if e.compressed and e.size < 9:
+            return f"{e.name}: truncated compressed entry"
+    return None
+
+@traced("io.verify_packs")
+def verify_packs(pack_paths, workers=None):
+    """
+    {path: reason} for the broken packs among pack_paths. Verdicts go through cached_pack_info;
+    packs without one are checked in parallel.
+    """
+    def check(path):
+        try:
+            return path, cached_pack_info(path, "verdict", verify_pack)
+        except OSError:
+            return path, None   # disappeared meanwhile, the watcher will drop it
+    with ThreadPoolExecutor(max_workers=workers or PACK_WORKERS) as pool:
+        verdicts = list(pool.map(check, pack_paths))
+    return {path: reason for path, reason in verdicts if reason}
+
+# ------------- extra mod sources (Steam Workshop) ---------------
+# Packs outside data/ (one sub-folder per item, like workshop/content/<app id>/<item id>/) are used in place:
+# user.script gets an add_working_directory line for their folder right before their mod line.
+
+WORKSHOP_APP_ID = "594570"
+_external_packs = {}    # pack filename -> full path for mods outside data/ (filled by scan_mods)
+
+def find_workshop_dir(game_path):
+    """<steamapps>/workshop/content/594570 for a game installed in <steamapps>/common/<game>, or None."""
+    steamapps = os.path.dirname(os.path.dirname(os.path.abspath(game_path)))
+    path = os.path.join(steamapps, "workshop", "content", WORKSHOP_APP_ID)
+    return path if os.path.isdir(path) else None
+
+def get_mod_sources(game_path):
+    """Extra mod roots: the detected Workshop folder plus config.json "mod_sources"."""
+    roots = []
+    workshop = find_workshop_dir(game_path)
+    if workshop:
+        roots.append(workshop)
+    for root in load_settings().get("mod_sources", []):
+        if os.path.isdir(root) and root not in roots:
+            roots.append(root)
+    return roots
+
+def _list_item(item_dir):
+    """[[pack_filename, png_filename_or_None], ...] of one item folder."""
+    files = os.listdir(item_dir)
+    by_lower = {f.lower(): f for f in files}
+    return [[f, by_lower.get(os.path.splitext(f)[0].lower() + ".png")] for f in files if f.lower().endswith(".pack")]
+
+@traced("io.scan_mod_sources")
+def scan_mod_sources(roots, workers=8):
+    """
+    List of (pack_filename, pack_path, png_path_or_None) from all item folders under roots.
+    Item listings go through cached_pack_info per folder; the folders are checked concurrently.
+    """
+    items = []
+    for root in roots:
+        try:
+            with os.scandir(root) as it:
+                items.extend(entry.path for entry in it if entry.is_dir())
+        except OSError:
+            continue
+
+    def scan(item):
+        try:
+            listing = cached_pack_info(item, "items", _list_item)
+        except OSError:
+            return []
+        return [(pack, os.path.join(item, pack), os.path.join(item, png) if png else None) for pack, png in listing]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        found = [mod for mods in pool.map(scan, sorted(items)) for mod in mods]
+    if TRACER.enabled:
+        TRACER.count("stats", len(items))
+    return found
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def register_external_mods(game_path, data_mods, standard_files=(), registry=None):
+    """
+    Scan the extra sources and remember where their packs are (in registry, default the module one).
+    Packs already in data/ under the same name, or with the same content under another name, are skipped.
+    Returns [(pack_filename, png_path_or_None)].
+    """
+    if registry is None:
+        registry = _external_packs
+    registry.clear()
+    data_path = os.path.join(game_path, "data")
+    names = {name for name, _png in data_mods}
+    sizes = None
+    out = []
+    for pack, path, png in scan_mod_sources(get_mod_sources(game_path)):
+        if pack in names or pack in standard_files:
+            continue
+        try:
+            if sizes is None:
+                sizes = {}
+                for name in names:
+                    sizes.setdefault(os.path.getsize(os.path.join(data_path, name)), []).append(name)
+            twins = sizes.get(os.path.getsize(path), [])
+            if twins:
+                digest = cached_pack_info(path, "sha256", file_sha256)
+                if any(cached_pack_info(os.path.join(data_path, t), "sha256", file_sha256) == digest for t in twins):
+                    continue
+        except OSError:
+            continue
+        names.add(pack)
+        registry[pack] = path
+        out.append((pack, png))
+    return out
+
+def is_external_mod(mod_name):
+    return mod_name in _external_packs
+
+def mod_path(game_path, mod_name):
+    """Full path of a mod's .pack: in data/ or in its Workshop/extra-source folder."""
+    return _external_packs.get(mod_name) or os.path.join(game_path, "data", mod_name)
+
+# ------------- search index ---------------
+
+class ModSearchIndex:
+    """
+    Trigram index over pack file names and display names.
+    add()/remove() are incremental, search() only verifies the candidates the trigrams let through.
+    """
+
+    def __init__(self):
+        self._texts = {}   # mod -> lowercased searchable text
+        self._grams = {}   # trigram -> set of mods
+
+    @staticmethod
+    def _trigrams(text):
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def __contains__(self, mod):
+        return mod in self._texts
+
+    def __len__(self):
+        return len(self._texts)
+
+    def __iter__(self):
+        return iter(list(self._texts))
+
+    def add(self, mod, *texts):
+        if mod in self._texts:
+            self.remove(mod)
+        # "\n" between parts keeps trigrams from spanning a file name and a title
+        text = "\n".join(t.lower() for t in (mod,) + texts if t)
+        self._texts[mod] = text
+        for g in self._trigrams(text):
+            self._grams.setdefault(g, set()).add(mod)
+
+    def remove(self, mod):
+        text = self._texts.pop(mod, None)
+        if text is None:
+            return
+        for g in self._trigrams(text):
+            bucket = self._grams.get(g)
+            if bucket is not None:
+                bucket.discard(mod)
+                if not bucket:
+                    del self._grams[g]
+
+    def search(self, query):
+        """Set of mods containing every whitespace-separated word of query (all mods for an empty query)."""
+        result = None
+        for word in query.lower().split():
+            if len(word) < 3:
+                pool = self._texts.keys() if result is None else result
+                found = {m for m in pool if word in self._texts[m]}
+            else:
+                buckets = sorted((self._grams.get(g, ()) for g in self._trigrams(word)), key=len)
+                candidates = set(buckets[0]).intersection(*buckets[1:])
+                if result is not None:
+                    candidates &= result
+                found = {m for m in candidates if word in self._texts[m]}
+            result = found
+            if not result:
+                break
+        return set(self._texts) if result is None else result
+
 # ------------- active_mods.script handling ---------------
 
-def read_active_mods_file():
-    path = get_active_mods_path()
+@traced("io.read_active_mods_file")
+def read_active_mods_file(scripts_dir=None):
+    path = get_active_mods_path(scripts_dir)
     if os.path.exists(path):
         lines = read_lines(path)
         return [ln for ln in lines if ln]
     # bootstrap from user.script: take non-standard mod lines
-    user_lines = read_user_script_lines()
+    mods = user_script_mod_order(scripts_dir)
+    safe_write_lines(path, mods)
+    return mods
+
+@traced("io.write_active_mods_file")
+def write_active_mods_file(mod_list, scripts_dir=None):
+    path = get_active_mods_path(scripts_dir)
+    safe_write_lines(path, list(mod_list))
+
+# ------------- user.script helpers ---------------
+
+def read_user_script_lines(scripts_dir=None):
+    return read_lines(get_user_script_path(scripts_dir))
+
+def write_user_script_lines(lines, scripts_dir=None):
+    safe_write_lines(get_user_script_path(scripts_dir), list(lines))
+
+def user_script_mod_order(scripts_dir=None):
+    """Non-standard mod "..."; entries of user.script in file order (what the official launcher enabled)."""
     standard = set(load_standard_packs())
     mods = []
-    for ln in user_lines:
+    seen = set()
+    for ln in read_user_script_lines(scripts_dir):
         s = ln.strip()
         if s.startswith('mod "') and s.endswith('";'):
             try:
                 name = s.split('"')[1]
-                if name not in standard:
-                    mods.append(name)
             except Exception:
                 continue
-    safe_write_lines(path, mods)
+            if name not in standard and name not in seen:
+                seen.add(name)
+                mods.append(name)
     return mods
 
-def write_active_mods_file(mod_list):
-    path = get_active_mods_path()
-    safe_write_lines(path, list(mod_list))
-
-# ------------- user.script helpers ---------------
-
-def read_user_script_lines():
-    return read_lines(get_user_script_path())
-
-def write_user_script_lines(lines):
-    safe_write_lines(get_user_script_path(), list(lines))
-
 def remove_mod_from_user_script(mod_name):
     """Remove any lines for this mod from user.script (if present)."""
-    lines = read_user_script_lines()
+    return remove_mods_from_user_script([mod_name])
+
+@traced("io.remove_mods_from_user_script")
+def remove_mods_from_user_script(mod_names, scripts_dir=None):
+    """Remove the lines of all given mods from user.script with a single read and at most one write."""
+    names = set(mod_names)
+    if not names:
+        return False
+    lines = read_user_script_lines(scripts_dir)
     out = []
     changed = False
     for ln in lines:
@@ -135,28 +868,44 @@ def remove_mod_from_user_script(mod_name):
                 name = s.split('"')[1]
             except Exception:
                 name = None
-            if name == mod_name:
+            if name in names:
                 changed = True
                 continue
         out.append(ln)
     if changed:
-        write_user_script_lines(out)
+        write_user_script_lines(out, scripts_dir)
     return changed
 
-def sync_active_into_user_script(active_order):
+@traced("io.sync_active_into_user_script")
+def sync_active_into_user_script(active_order, scripts_dir=None, external=None):
     """
     Основная функция для кнопки 'Сохранить':
     - Удаляет из user.script все НЕ-стандартные (нашe) записи mod "...";
     - Затем в конец файла добавляет active_order в указанном порядке.
     - Стандартные (системные) моды остаются на своих местах.
     """
-    existing = read_user_script_lines()
+    snapshot_scripts("save", scripts_dir)
+    write_user_script_lines(compile_user_script(active_order, scripts_dir=scripts_dir, external=external), scripts_dir)
+    return True
+
+def compile_user_script(active_order, existing=None, scripts_dir=None, external=None):
+    """
+    Lines of user.script as sync_active_into_user_script would write them (existing defaults to the current file,
+    external — locations of mods outside data/ — to the registry filled by scan_mods).
+    """
+    if existing is None:
+        existing = read_user_script_lines(scripts_dir)
+    if external is None:
+        external = _external_packs
     standard = set(load_standard_packs())
 
     # Собираем все существующие строки, пропуская наши (не-стандартные) мод-строки
     out = []
     for ln in existing:
         s = ln.strip()
+        if s.startswith('add_working_directory "'):
+            # папки модов из Workshop — пишутся заново вместе с их строками mod
+            continue
         if s.startswith('mod "') and s.endswith('";'):
             try:
                 name = s.split('"')[1]
@@ -172,55 +921,1995 @@ def sync_active_into_user_script(active_order):
         else:
             out.append(ln)
 
-    # Добавляем активные моды в нужном порядке в конец (только тех, которые есть в active_order)
-    for m in active_order:
-        line = f'mod "{m}";'
-        # двойной контроль: не добавляем если такая точная строка уже где-то есть
-        if line not in out:
-            out.append(line)
+    # Добавляем активные моды в нужном порядке в конец (только тех, которые есть в active_order)
+    present = set(out)
+    for m in active_order:
+        line = f'mod "{m}";'
+        # двойной контроль: не добавляем если такая точная строка уже где-то есть
+        if line not in present:
+            present.add(line)
+            if m in external:
+                folder = os.path.dirname(external[m]).replace("\\", "/")
+                out.append(f'add_working_directory "{folder}";')
+            out.append(line)
+    return out
+
+# ------------- load-order profiles ---------------
+# <scripts>/mod_profiles/<name>.json: {"name", "order", "user_script"}; user_script is the precompiled
+# user.script.txt payload, so switching is a plain atomic replace.
+
+def get_profiles_dir():
+    return os.path.join(get_scripts_dir(), "mod_profiles")
+
+def _profile_path(name):
+    safe = re.sub(r'[<>:"/\\|?*\x00-\x1f]', "_", name).strip(" .") or "_"
+    return os.path.join(get_profiles_dir(), safe + ".json")
+
+def list_profiles():
+    names = []
+    try:
+        with os.scandir(get_profiles_dir()) as it:
+            for entry in it:
+                if entry.name.endswith(".json"):
+                    try:
+                        with open(entry.path, "r", encoding="utf-8") as f:
+                            names.append(json.load(f)["name"])
+                    except (OSError, ValueError, KeyError):
+                        continue
+    except OSError:
+        pass
+    names.sort(key=str.lower)
+    return names
+
+@traced("io.save_profile")
+def save_profile(name, active_order):
+    order = list(active_order)
+    payload = {"name": name, "order": order, "user_script": compile_user_script(order)}
+    safe_write_lines(_profile_path(name), [json.dumps(payload, ensure_ascii=False)])
+
+def load_profile(name):
+    with open(_profile_path(name), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def delete_profile(name):
+    try:
+        os.remove(_profile_path(name))
+    except FileNotFoundError:
+        pass
+
+@traced("io.apply_profile")
+def apply_profile(name, catalog):
+    """
+    Switch to a profile: validate its order against catalog (available pack names, e.g. from scan_mods),
+    then replace user.script with the precompiled payload and write active_mods.script.
+    Mods missing from catalog are dropped and the payload is recompiled without them.
+    Returns (order, missing).
+    """
+    profile = load_profile(name)
+    order = [m for m in profile["order"] if m in catalog]
+    missing = [m for m in profile["order"] if m not in catalog]
+    lines = compile_user_script(order) if missing else profile["user_script"]
+    snapshot_scripts("profile")
+    write_user_script_lines(lines)
+    write_active_mods_file(order)
+    return order, missing
+
+# ------------- script backups ---------------
+# Content-addressed store in <scripts>/mod_backups: objects/<sha256>.gz holds each distinct version of
+# a script file once, index.json lists snapshots (oldest first) as {"id", "time", "reason", "files"}.
+
+BACKUP_MAX_SNAPSHOTS = 200
+BACKUP_MAX_BYTES = 16 * 1024 * 1024   # compressed size of all kept objects
+
+def get_backups_dir(scripts_dir=None):
+    return os.path.join(get_scripts_dir(scripts_dir), "mod_backups")
+
+def _backup_targets(scripts_dir=None):
+    return {"user.script.txt": get_user_script_path(scripts_dir), "active_mods.script": get_active_mods_path(scripts_dir)}
+
+def _backup_object_path(digest, scripts_dir=None):
+    return os.path.join(get_backups_dir(scripts_dir), "objects", digest + ".gz")
+
+def list_backups(scripts_dir=None):
+    """Snapshots, newest first."""
+    try:
+        with open(os.path.join(get_backups_dir(scripts_dir), "index.json"), "r", encoding="utf-8") as f:
+            return list(reversed(json.load(f)))
+    except (OSError, ValueError):
+        return []
+
+def _write_backup_index(snapshots, scripts_dir=None):
+    """snapshots: oldest first."""
+    safe_write_lines(os.path.join(get_backups_dir(scripts_dir), "index.json"),
+                     [json.dumps(snapshots, ensure_ascii=False)])
+
+@traced("io.snapshot_scripts")
+def snapshot_scripts(reason="", scripts_dir=None):
+    """
+    Store the current user.script and active_mods.script as a new snapshot. Identical versions are stored once;
+    nothing is recorded if both files are unchanged since the last snapshot. Returns the snapshot or None.
+    """
+    files = {}
+    for key, path in _backup_targets(scripts_dir).items():
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            files[key] = None
+            continue
+        digest = hashlib.sha256(data).hexdigest()
+        obj = _backup_object_path(digest, scripts_dir)
+        if not os.path.exists(obj):
+            safe_write_bytes(obj, gzip.compress(data))
+        files[key] = digest
+    snapshots = list(reversed(list_backups(scripts_dir)))
+    if snapshots and snapshots[-1]["files"] == files:
+        return None
+    now = time.time()
+    snap = {"id": f"{int(now * 1000)}", "time": now, "reason": reason, "files": files}
+    snapshots.append(snap)
+    _write_backup_index(prune_backups(snapshots, scripts_dir=scripts_dir), scripts_dir)
+    return snap
+
+def prune_backups(snapshots, max_count=BACKUP_MAX_SNAPSHOTS, max_bytes=BACKUP_MAX_BYTES, scripts_dir=None):
+    """Drop the oldest snapshots beyond the count/size limits and delete objects nobody references any more."""
+    snapshots = snapshots[-max_count:]
+
+    def obj_size(digest):
+        try:
+            return os.path.getsize(_backup_object_path(digest, scripts_dir))
+        except OSError:
+            return 0
+
+    sizes = {}
+    for snap in snapshots:
+        for digest in snap["files"].values():
+            if digest and digest not in sizes:
+                sizes[digest] = obj_size(digest)
+    refs = {}
+    for snap in snapshots:
+        for digest in set(d for d in snap["files"].values() if d):
+            refs[digest] = refs.get(digest, 0) + 1
+    total = sum(sizes.values())
+    while len(snapshots) > 1 and total > max_bytes:
+        for digest in set(d for d in snapshots.pop(0)["files"].values() if d):
+            refs[digest] -= 1
+            if not refs[digest]:
+                total -= sizes[digest]
+    objects_dir = os.path.join(get_backups_dir(scripts_dir), "objects")
+    try:
+        with os.scandir(objects_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".gz") and not refs.get(entry.name[:-3]):
+                    os.remove(entry.path)
+    except OSError:
+        pass
+    return snapshots
+
+def read_backup_text(digest):
+    if not digest:
+        return ""
+    with open(_backup_object_path(digest), "rb") as f:
+        return gzip.decompress(f.read()).decode("utf-8", errors="replace")
+
+def diff_backup(snapshot):
+    """Unified diff from the snapshot to the current files."""
+    out = []
+    for key, path in _backup_targets().items():
+        old = read_backup_text(snapshot["files"].get(key)).splitlines()
+        new = read_lines(path)
+        out.extend(difflib.unified_diff(old, new, fromfile=f"{key} ({snapshot['id']})", tofile=key, lineterm=""))
+    return out
+
+@traced("io.restore_backup")
+def restore_backup(snapshot):
+    """Write the snapshot's files back (the current state is snapshotted first, so a restore can be reverted)."""
+    snapshot_scripts("restore")
+    for key, path in _backup_targets().items():
+        digest = snapshot["files"].get(key)
+        if digest:
+            safe_write_lines(path, read_backup_text(digest).splitlines())
+
+# ------------- game installs ---------------
+# config.json "installs": [{"name", "game_path", "scripts_dir"}]. scripts_dir is optional (default: the
+# %APPDATA% location), so each install or prefix can keep its own user.script and active_mods.script.
+
+def _same_path(a, b):
+    return os.path.normcase(os.path.abspath(a)) == os.path.normcase(os.path.abspath(b))
+
+def list_installs():
+    """Registered installs; a game_path set before installs existed is listed too."""
+    settings = load_settings()
+    installs = list(settings.get("installs", []))
+    current = settings.get("game_path")
+    if current and not any(_same_path(i["game_path"], current) for i in installs):
+        installs.insert(0, {"name": os.path.basename(current.rstrip("\\/")) or current, "game_path": current})
+    return installs
+
+def find_install(game_path):
+    if not game_path:
+        return None
+    return next((i for i in list_installs() if _same_path(i["game_path"], game_path)), None)
+
+def register_install(game_path, name=None, scripts_dir=None):
+    """Add (or update) an install in config.json and return it."""
+    settings = load_settings()
+    installs = settings.setdefault("installs", [])
+    for install in installs:
+        if _same_path(install["game_path"], game_path):
+            break
+    else:
+        install = {"name": name or os.path.basename(game_path.rstrip("\\/")) or game_path, "game_path": game_path}
+        installs.append(install)
+    if name:
+        install["name"] = name
+    if scripts_dir:
+        install["scripts_dir"] = scripts_dir
+    save_settings(settings)
+    return install
+
+def install_scripts_dir(install):
+    """Normalized scripts folder of an install (Steam installs on one machine usually share the default one)."""
+    return os.path.normcase(get_scripts_dir(install.get("scripts_dir") or DEFAULT_SCRIPTS_DIR))
+
+@traced("io.push_order_to_install")
+def push_order_to_install(order, install):
+    """
+    Apply a load order to one install: its own catalog decides what can be enabled.
+    Returns {"name", "game_path", "enabled", "missing", "error", "shared_with"}.
+    """
+    game = install["game_path"]
+    scripts_dir = install.get("scripts_dir") or DEFAULT_SCRIPTS_DIR
+    report = {"name": install.get("name") or game, "game_path": game, "enabled": 0, "missing": [], "error": None,
+              "shared_with": None}
+    try:
+        if not os.path.isdir(os.path.join(game, "data")):
+            raise OSError(f"no data folder in {game}")
+        external = {}
+        catalog = {name for name, _png in scan_mods(game, external)}
+        enabled = [m for m in order if m in catalog]
+        report["missing"] = [m for m in order if m not in catalog]
+        write_active_mods_file(enabled, scripts_dir)
+        sync_active_into_user_script(enabled, scripts_dir, external)
+        report["enabled"] = len(enabled)
+    except (OSError, ValueError) as ex:
+        report["error"] = str(ex)
+    return report
+
+def push_order_to_installs(order, installs, workers=4):
+    """
+    Apply one load order to several installs at once; one report per install, in the given order.
+    Installs sharing a scripts folder would overwrite each other's files: only the last of them is written,
+    the others are reported with "shared_with" set to its name.
+    """
+    if not installs:
+        return []
+    order = list(order)
+    last = {install_scripts_dir(i): i for i in installs}
+    reports = {}
+
+    def push(install):
+        reports[id(install)] = push_order_to_install(order, install)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(last)))) as pool:
+        list(pool.map(push, last.values()))
+    out = []
+    for install in installs:
+        report = reports.get(id(install))
+        if report is None:
+            winner = last[install_scripts_dir(install)]
+            report = {"name": install.get("name") or install["game_path"], "game_path": install["game_path"],
+                      "enabled": 0, "missing": [], "error": None,
+                      "shared_with": winner.get("name") or winner["game_path"]}
+        out.append(report)
+    return out
+
+# ------------- load order edits ---------------
+# Pure functions over the active order list: the UI applies them in memory and persists the result once.
+
+class LoadOrder:
+    """
+    Active load order: a list plus a name -> position map. Lookups are O(1) and a move
+    only renumbers the span between the old and the new position.
+    """
+
+    def __init__(self, names=()):
+        self._items = list(names)
+        self._pos = {n: i for i, n in enumerate(self._items)}
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __contains__(self, name):
+        return name in self._pos
+
+    def __getitem__(self, i):
+        return self._items[i]
+
+    def __eq__(self, other):
+        if isinstance(other, LoadOrder):
+            other = other._items
+        return self._items == list(other)
+
+    def __repr__(self):
+        return f"LoadOrder({self._items!r})"
+
+    def index(self, name):
+        try:
+            return self._pos[name]
+        except KeyError:
+            raise ValueError(f"{name!r} is not in the load order") from None
+
+    def to_list(self):
+        return list(self._items)
+
+    def move(self, name, index):
+        """Move name so that it ends up at index (clamped). Returns the old position."""
+        old = self.index(name)
+        index = max(0, min(index, len(self._items) - 1))
+        if old != index:
+            self._items.insert(index, self._items.pop(old))
+            for i in range(min(old, index), max(old, index) + 1):
+                self._pos[self._items[i]] = i
+        return old
+
+def enable_mods(order, names):
+    """Append the not yet active mods from names (in the given order)."""
+    present = set(order)
+    out = list(order)
+    for n in names:
+        if n not in present:
+            present.add(n)
+            out.append(n)
+    return out
+
+def disable_mods(order, names):
+    names = set(names)
+    return [m for m in order if m not in names]
+
+def move_mods(order, names, position):
+    """
+    Move the active mods from names to position ("top", "bottom" or an index into the remaining list),
+    keeping their relative order.
+    """
+    names = set(names)
+    moving = [m for m in order if m in names]
+    rest = [m for m in order if m not in names]
+    if position == "top":
+        i = 0
+    elif position == "bottom":
+        i = len(rest)
+    else:
+        i = max(0, min(int(position), len(rest)))
+    return rest[:i] + moving + rest[i:]
+
+# ------------- undo / redo ---------------
+# History steps are delta records, not list copies: a move is two indices, enabling/disabling keeps only
+# the affected (index, name) pairs, anything else keeps the differing middle slice. Names are shared
+# with the live list, so memory grows with the size of the edits, not with edits x list length.
+
+def make_order_delta(old, new):
+    """Compact delta turning old into new, or None if they are equal."""
+    old, new = list(old), list(new)
+    if old == new:
+        return None
+    if len(old) == len(new):
+        start = 0
+        while old[start] == new[start]:
+            start += 1
+        end = len(old)
+        while old[end - 1] == new[end - 1]:
+            end -= 1
+        if old[start] == new[end - 1] and old[start + 1:end] == new[start:end - 1]:
+            return ("move", start, end - 1, old[start])
+        if old[end - 1] == new[start] and old[start:end - 1] == new[start + 1:end]:
+            return ("move", end - 1, start, new[start])
+    old_set, new_set = set(old), set(new)
+    if new_set <= old_set and [m for m in old if m in new_set] == new:
+        return ("remove", tuple((i, m) for i, m in enumerate(old) if m not in new_set))
+    if old_set <= new_set and [m for m in new if m in old_set] == old:
+        return ("insert", tuple((i, m) for i, m in enumerate(new) if m not in old_set))
+    start = 0
+    while start < min(len(old), len(new)) and old[start] == new[start]:
+        start += 1
+    tail = 0
+    while tail < min(len(old), len(new)) - start and old[-1 - tail] == new[-1 - tail]:
+        tail += 1
+    return ("splice", start, tuple(old[start:len(old) - tail]), tuple(new[start:len(new) - tail]))
+
+def apply_order_delta(order, delta, reverse=False):
+    """
+    Apply delta (or its inverse) to a copy of order. Raises ValueError if order is not the state the
+    delta was recorded against (e.g. it was changed outside the history).
+    """
+    out = list(order)
+    kind = delta[0]
+    if kind == "move":
+        i, j, m = delta[1], delta[2], delta[3]
+        if reverse:
+            i, j = j, i
+        if not (0 <= i < len(out)) or out[i] != m:
+            raise ValueError("history does not match the current order")
+        out.insert(j, out.pop(i))
+    elif kind in ("remove", "insert"):
+        pairs = delta[1]
+        if (kind == "remove") != reverse:
+            for i, m in reversed(pairs):
+                if i >= len(out) or out[i] != m:
+                    raise ValueError("history does not match the current order")
+                del out[i]
+        else:
+            for i, m in pairs:
+                out.insert(i, m)
+    else:
+        start, before, after = delta[1], delta[2], delta[3]
+        if reverse:
+            before, after = after, before
+        if tuple(out[start:start + len(before)]) != before:
+            raise ValueError("history does not match the current order")
+        out[start:start + len(before)] = after
+    return out
+
+class OrderHistory:
+    """Unlimited undo/redo stack of load-order deltas."""
+
+    def __init__(self):
+        self._undo = []
+        self._redo = []
+
+    def can_undo(self):
+        return bool(self._undo)
+
+    def can_redo(self):
+        return bool(self._redo)
+
+    def clear(self):
+        self._undo.clear()
+        self._redo.clear()
+
+    def record(self, old, new):
+        delta = make_order_delta(old, new)
+        if delta is not None:
+            self.push(delta)
+
+    def push(self, delta):
+        self._undo.append(delta)
+        self._redo.clear()
+
+    def undo(self, order):
+        """Previous order, or None if there is nothing (valid) to undo."""
+        return self._step(order, self._undo, self._redo, True)
+
+    def redo(self, order):
+        return self._step(order, self._redo, self._undo, False)
+
+    def _step(self, order, src, dst, reverse):
+        if not src:
+            return None
+        delta = src[-1]
+        try:
+            out = apply_order_delta(order, delta, reverse=reverse)
+        except ValueError:
+            self.clear()
+            return None
+        dst.append(src.pop())
+        return out
+
+# ------------- pack/zip add/delete ---------------
+
+@traced("io.add_pack_file")
+def add_pack_file(pack_path, game_path):
+    data_path = os.path.join(game_path, "data")
+    os.makedirs(data_path, exist_ok=True)
+    dest = os.path.join(data_path, os.path.basename(pack_path))
+    # уже установленный мод заменяется новой версией (если она отличается)
+    if not _same_file_content(pack_path, dest):
+        replace_file_copy(pack_path, dest)
+        if TRACER.enabled:
+            TRACER.count("bytes_written", os.path.getsize(dest))
+    png_candidate = os.path.splitext(pack_path)[0] + ".png"
+    if os.path.exists(png_candidate):
+        dest_png = os.path.join(data_path, os.path.basename(png_candidate))
+        if not _same_file_content(png_candidate, dest_png):
+            replace_file_copy(png_candidate, dest_png)
+
+def _same_file_content(src, dest):
+    """True if dest exists with the same size and (mtime or sha256) as src."""
+    try:
+        s_st, d_st = os.stat(src), os.stat(dest)
+    except OSError:
+        return False
+    if s_st.st_size != d_st.st_size:
+        return False
+    if s_st.st_mtime_ns == d_st.st_mtime_ns:
+        return True
+    return cached_pack_info(src, "sha256", file_sha256) == cached_pack_info(dest, "sha256", file_sha256)
+
+def replace_file_copy(src, dest):
+    """Copy src over dest atomically (temp file in dest's folder -> replace), keeping src's mtime."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dest), suffix=".tmp")
+    os.close(fd)
+    try:
+        shutil.copy2(src, tmp)
+        os.replace(tmp, dest)
+    except Exception:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+@traced("io.add_zip_archive")
+def add_zip_archive(zip_path, game_path):
+    data_path = os.path.join(game_path, "data")
+    os.makedirs(data_path, exist_ok=True)
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        for member in zip_ref.namelist():
+            filename = os.path.basename(member)
+            if not filename:
+                continue
+            if filename.lower().endswith(".pack") or filename.lower().endswith(".png"):
+                # распаковка во временный файл: прерванная распаковка не оставит полупустой .pack
+                target_path = os.path.join(data_path, filename)
+                tmp_path = target_path + ".part"
+                try:
+                    with zip_ref.open(member) as src, open(tmp_path, "wb") as dst:
+                        shutil.copyfileobj(src, dst)
+                        if TRACER.enabled:
+                            TRACER.count("bytes_written", dst.tell())
+                    os.replace(tmp_path, target_path)
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+
+# ------------- trash ---------------
+# Deleted mods are renamed into <game>/mm_trash/<time_ns>_<mod name>/ (same volume as data/, so deleting is
+# instant and can be undone); purge_trash reclaims the space later, in the background.
+
+TRASH_DIR = "mm_trash"
+TRASH_MAX_MB = 2048    # default for config.json "trash_max_mb"
+TRASH_MAX_DAYS = 14    # default for config.json "trash_days"
+
+def get_trash_dir(game_path):
+    return os.path.join(game_path, TRASH_DIR)
+
+@traced("io.delete_mod_files")
+def delete_mod_files(mod_name, game_path):
+    """Move the pack, its preview and merge manifest into the trash. Returns the trash entry or None."""
+    if is_external_mod(mod_name):
+        return None   # Workshop files belong to Steam, unsubscribing removes them
+    data_path = os.path.join(game_path, "data")
+    mod_path = os.path.join(data_path, mod_name)
+    png_path = os.path.join(data_path, os.path.splitext(mod_name)[0] + ".png")
+    if TRACER.enabled:
+        TRACER.count("stats", 3)
+    files = [p for p in (mod_path, png_path, merge_manifest_path(mod_path)) if os.path.exists(p)]
+    if not files:
+        return None
+    entry = os.path.join(get_trash_dir(game_path), f"{time.time_ns()}_{mod_name}")
+    os.makedirs(entry)
+    for p in files:
+        shutil.move(p, os.path.join(entry, os.path.basename(p)))   # a plain rename on the same volume
+    return entry
+
+def _trash_entry_info(entry):
+    stamp, _, name = os.path.basename(entry).partition("_")
+    size = 0
+    for item in os.scandir(entry):
+        try:
+            size += item.stat().st_size
+        except OSError:
+            pass
+    return {"path": entry, "name": name, "time": int(stamp) / 1e9, "size": size}
+
+def list_trash(game_path):
+    """Trash entries, newest first: [{"path", "name", "time", "size"}]."""
+    trash = get_trash_dir(game_path)
+    if not os.path.isdir(trash):
+        return []
+    entries = []
+    for item in os.scandir(trash):
+        if item.is_dir() and item.name.partition("_")[0].isdigit():
+            entries.append(_trash_entry_info(item.path))
+    entries.sort(key=lambda e: e["time"], reverse=True)
+    return entries
+
+@traced("io.restore_trashed_mod")
+def restore_trashed_mod(entry, game_path):
+    """
+    Move a trash entry back into data/. Returns the png path or None, like scan_mods.
+    Raises FileExistsError if data/ already has a mod with that name.
+    """
+    data_path = os.path.join(game_path, "data")
+    names = os.listdir(entry)
+    for name in names:
+        if os.path.exists(os.path.join(data_path, name)):
+            raise FileExistsError(f"{name} already exists in data/")
+    png = None
+    for name in names:
+        dest = os.path.join(data_path, name)
+        shutil.move(os.path.join(entry, name), dest)
+        if name.lower().endswith(".png"):
+            png = dest
+    os.rmdir(entry)
+    return png
+
+@traced("io.purge_trash")
+def purge_trash(game_path, max_bytes=TRASH_MAX_MB * 1024 * 1024, max_age=TRASH_MAX_DAYS * 86400):
+    """
+    Remove trash entries older than max_age seconds, then the oldest ones until the rest fits in max_bytes.
+    Returns (entries removed, bytes freed).
+    """
+    entries = list_trash(game_path)
+    total = sum(e["size"] for e in entries)
+    now = time.time()
+    removed = freed = 0
+    for e in reversed(entries):   # oldest first
+        if now - e["time"] <= max_age and total <= max_bytes:
+            break
+        shutil.rmtree(e["path"], ignore_errors=True)
+        total -= e["size"]
+        removed += 1
+        freed += e["size"]
+    return removed, freed
+
+# ------------- garbage collection ---------------
+# Leftovers nobody cleans up: previews and merge manifests of packs that are gone, temp files of interrupted
+# writes and extractions, user.script lines of missing mods and pack cache entries of missing files.
+# find_garbage only reads (one scandir of data/ and of the scripts folder, one user.script parse);
+# collect_garbage re-checks every item before removing it.
+
+GC_MIN_AGE = 3600   # temp files younger than this may still be in use
+GC_BATCH = 256      # directory entries between yields to other threads
+_MKSTEMP_NAME = re.compile(r"^tmp[a-z0-9_]{8}(\.tmp)?$")
+
+def _is_temp_name(name, data_dir):
+    lower = name.lower()
+    if _MKSTEMP_NAME.match(lower):
+        return True
+    return data_dir and lower.endswith((".part", ".tmp"))
+
+def _sweep_dir(path, data_dir, now):
+    """{name: (size, mtime)} of regular files in path plus the temp files among them."""
+    files = {}
+    temp = []
+    try:
+        it = os.scandir(path)
+    except OSError:
+        return files, temp
+    with it:
+        for i, item in enumerate(it):
+            if i and i % GC_BATCH == 0:
+                time.sleep(0)   # a sweep over tens of thousands of entries must not stall the UI thread
+            try:
+                if not item.is_file():
+                    continue
+                st = item.stat()
+            except OSError:
+                continue
+            files[item.name] = (st.st_size, st.st_mtime)
+            if _is_temp_name(item.name, data_dir) and now - st.st_mtime > GC_MIN_AGE:
+                temp.append((item.path, st.st_size))
+    return files, temp
+
+def _plain_script_mods(scripts_dir=None):
+    """
+    Non-standard mod "..."; entries of user.script that load from data/: a line right after
+    add_working_directory names a pack in that folder, which may be one get_mod_sources does not know.
+    """
+    standard = set(load_standard_packs())
+    mods = []
+    after_dir = False
+    for ln in read_user_script_lines(scripts_dir):
+        s = ln.strip()
+        if not s:
+            continue
+        if s.startswith('mod "') and s.endswith('";') and not after_dir:
+            name = s.split('"')[1]
+            if name not in standard and name not in mods:
+                mods.append(name)
+        after_dir = s.startswith("add_working_directory")
+    return mods
+
+@traced("io.find_garbage")
+def find_garbage(game_path, scripts_dir=None):
+    """
+    {"previews", "manifests", "temp": [(path, size)], "script_lines": [mod names], "cache_entries": [keys],
+     "bytes": reclaimable bytes}
+    """
+    now = time.time()
+    data_path = os.path.join(game_path, "data")
+    files, temp = _sweep_dir(data_path, True, now)
+    temp += _sweep_dir(get_scripts_dir(scripts_dir), False, now)[1]
+    packs = {n.lower() for n in files if n.lower().endswith(".pack")}
+
+    previews = []
+    manifests = []
+    for name, (size, _mtime) in files.items():
+        lower = name.lower()
+        if lower.endswith(".png") and lower[:-4] + ".pack" not in packs:
+            previews.append((os.path.join(data_path, name), size))
+        elif lower.endswith(".pack" + MERGE_MANIFEST_SUFFIX) and lower[:-len(MERGE_MANIFEST_SUFFIX)] not in packs:
+            manifests.append((os.path.join(data_path, name), size))
+
+    script_lines = [m for m in _plain_script_mods(scripts_dir) if m.lower() not in packs and not is_external_mod(m)]
+
+    data_key = os.path.normcase(os.path.abspath(data_path))
+    present = {os.path.normcase(n) for n in files}
+    cache_entries = []
+    for key in sorted(set(pack_cache_keys()) | set(_db_keys_cache.keys())):
+        folder, name = os.path.split(key)
+        if folder == data_key:
+            if name not in present:
+                cache_entries.append(key)
+        elif not os.path.exists(key):
+            cache_entries.append(key)
+
+    return {
+        "previews": previews,
+        "manifests": manifests,
+        "temp": temp,
+        "script_lines": script_lines,
+        "cache_entries": cache_entries,
+        "bytes": sum(size for group in (previews, manifests, temp) for _path, size in group),
+    }
+
+@traced("io.collect_garbage")
+def collect_garbage(report, game_path, scripts_dir=None):
+    """Remove what find_garbage reported and is still garbage. Returns the bytes freed."""
+    data_path = os.path.join(game_path, "data")
+    freed = 0
+
+    def pack_of(path, suffix):
+        return os.path.join(data_path, os.path.basename(path)[:-len(suffix)] + (".pack" if suffix == ".png" else ""))
+
+    doomed = [(p, size) for p, size in report["previews"] if not os.path.exists(pack_of(p, ".png"))]
+    doomed += [(p, size) for p, size in report["manifests"] if not os.path.exists(pack_of(p, MERGE_MANIFEST_SUFFIX))]
+    now = time.time()
+    for p, size in report["temp"]:
+        try:
+            if now - os.path.getmtime(p) > GC_MIN_AGE:
+                doomed.append((p, size))
+        except OSError:
+            pass
+    for p, size in doomed:
+        try:
+            os.remove(p)
+            freed += size
+        except OSError:
+            pass
+
+    stale = [m for m in report["script_lines"] if not os.path.exists(mod_path(game_path, m))]
+    if stale:
+        snapshot_scripts("gc", scripts_dir)
+        remove_mods_from_user_script(stale, scripts_dir)
+    gone = [k for k in report["cache_entries"] if not os.path.exists(k)]
+    drop_pack_cache_entries(gone)
+    _db_keys_cache.drop(gone)
+    save_pack_cache()
+    _db_keys_cache.save()
+    return freed
+
+# ------------- pack merger ---------------
+# Several packs -> one PFH5 pack; for files present in more than one source the later pack in the order wins.
+# <merged>.merge.json next to the merged pack remembers the sources (with their parsed indexes) and the
+# layout, so a rebuild re-reads only changed sources and, if the layout is unchanged, only rewrites their
+# payload in place.
+
+MERGE_MANIFEST_SUFFIX = ".merge.json"
+MERGE_FLAGS = 3   # PFH file type "mod", no timestamps, nothing encrypted
+
+def merge_manifest_path(merged_path):
+    return merged_path + MERGE_MANIFEST_SUFFIX
+
+def load_merge_manifest(merged_path):
+    try:
+        with open(merge_manifest_path(merged_path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def find_merged_packs(game_path):
+    """{merged pack name: [source pack names]} for every merged pack in data/."""
+    data_path = os.path.join(game_path, "data")
+    out = {}
+    try:
+        with os.scandir(data_path) as it:
+            for entry in it:
+                if entry.name.endswith(MERGE_MANIFEST_SUFFIX):
+                    merged = entry.name[:-len(MERGE_MANIFEST_SUFFIX)]
+                    manifest = load_merge_manifest(os.path.join(data_path, merged))
+                    if manifest:
+                        out[merged] = [src["name"] for src in manifest["sources"]]
+    except OSError:
+        pass
+    return out
+
+def _copy_range(src_fd, src_map, dst_fd, offset, size, dst_offset):
+    """Copy size bytes from src offset to dst_offset: copy_file_range where available, else an mmap slice."""
+    done = 0
+    if hasattr(os, "copy_file_range"):
+        try:
+            while done < size:
+                n = os.copy_file_range(src_fd, dst_fd, size - done, offset + done, dst_offset + done)
+                if n <= 0:
+                    break
+                done += n
+        except OSError:
+            pass
+    if done < size:
+        view = memoryview(src_map)[offset + done:offset + size]
+        try:
+            while view:
+                if hasattr(os, "pwrite"):
+                    n = os.pwrite(dst_fd, view, dst_offset + done)
+                else:
+                    os.lseek(dst_fd, dst_offset + done, os.SEEK_SET)
+                    n = os.write(dst_fd, view)
+                done += n
+                view = view[n:]
+        finally:
+            view.release()
+    if TRACER.enabled:
+        TRACER.count("bytes_written", size)
+
+def _merge_layout(sources):
+    """Winning entries sorted by path: [(name, source_name, offset_in_source, size, compressed)]."""
+    winners = {}
+    for src in sources:
+        for name, offset, size, compressed in src["index"]:
+            winners[name.lower()] = (name, src["name"], offset, size, compressed)
+    return [winners[k] for k in sorted(winners)]
+
+def _merged_index_bytes(layout):
+    return b"".join(struct.pack("<IB", size, 1 if compressed else 0) + name.encode("utf-8") + b"\0"
+                    for name, _src, _off, size, compressed in layout)
+
+@traced("io.merge_packs")
+def merge_packs(merged_name, source_names, game_path):
+    """
+    Build (or incrementally update) data/<merged_name> from the given packs in load order.
+    Returns {"mode": "unchanged"|"patched"|"rebuilt", "entries": n, "bytes": bytes copied}.
+    Raises FileExistsError if data/<merged_name> is an ordinary mod rather than an earlier merge.
+    """
+    data_path = os.path.join(game_path, "data")
+    merged_path = os.path.join(data_path, merged_name)
+    old = load_merge_manifest(merged_path) if os.path.exists(merged_path) else None
+    if old is None and os.path.exists(merged_path):
+        raise FileExistsError(f"{merged_name} already exists and is not a merged pack")
+    old_sources = {src["name"]: src for src in old["sources"]} if old else {}
+
+    sources = []
+    changed = set()
+    for name in source_names:
+        path = mod_path(game_path, name)
+        st = os.stat(path)
+        prev = old_sources.get(name)
+        if prev and prev["size"] == st.st_size and prev["mtime"] == st.st_mtime_ns:
+            sources.append(prev)
+            continue
+        idx = read_pack_index(path)
+        if idx.flags & PFH_HAS_ENCRYPTED_DATA:
+            raise ValueError(f"{name}: encrypted packs cannot be merged")
+        sources.append({"name": name, "size": st.st_size, "mtime": st.st_mtime_ns,
+                        "index": [[e.name, e.offset, e.size, e.compressed] for e in idx.entries]})
+        changed.add(name)
+
+    layout = _merge_layout(sources)
+    index = _merged_index_bytes(layout)
+    header_size = PFH_HEADER.size
+    data_offset = header_size + len(index)
+    total = data_offset + sum(e[3] for e in layout)
+
+    def target_layout(lay):
+        return [(name, src, size, bool(compressed)) for name, src, _off, size, compressed in lay]
+
+    same_layout = (old is not None and [s["name"] for s in old["sources"]] == list(source_names)
+                   and target_layout(_merge_layout(old["sources"])) == target_layout(layout)
+                   and os.path.getsize(merged_path) == total)
+    if same_layout and not changed:
+        return {"mode": "unchanged", "entries": 0, "bytes": 0}
+
+    fds = {}
+    maps = {}
+    tmp = None
+    copied = 0
+    written = 0
+    try:
+        def source(name):
+            if name not in fds:
+                fds[name] = os.open(mod_path(game_path, name), os.O_RDONLY | getattr(os, "O_BINARY", 0))
+                size = os.fstat(fds[name]).st_size
+                maps[name] = mmap.mmap(fds[name], 0, access=mmap.ACCESS_READ) if size else b""
+            return fds[name], maps[name]
+
+        if same_layout:
+            # same files, same sizes: overwrite only the payload that comes from changed sources
+            mode = "patched"
+            out_fd = os.open(merged_path, os.O_RDWR | getattr(os, "O_BINARY", 0))
+        else:
+            mode = "rebuilt"
+            out_fd, tmp = tempfile.mkstemp(dir=data_path, suffix=".tmp")
+            header = PFH_HEADER.pack(b"PFH5", MERGE_FLAGS, 0, 0, len(layout), len(index), int(time.time()))
+            os.write(out_fd, header + index)
+        try:
+            pos = data_offset
+            for name, src_name, offset, size, _compressed in layout:
+                if mode == "rebuilt" or src_name in changed:
+                    fd, src_map = source(src_name)
+                    _copy_range(fd, src_map, out_fd, offset, size, pos)
+                    copied += size
+                    written += 1
+                pos += size
+            if mode == "rebuilt":
+                os.ftruncate(out_fd, total)
+        finally:
+            os.close(out_fd)
+        if tmp:
+            os.replace(tmp, merged_path)
+            tmp = None
+    except Exception:
+        if tmp:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+        raise
+    finally:
+        for m in maps.values():
+            if isinstance(m, mmap.mmap):
+                m.close()
+        for fd in fds.values():
+            os.close(fd)
+
+    safe_write_lines(merge_manifest_path(merged_path), [json.dumps({"sources": sources})])
+    return {"mode": mode, "entries": written, "bytes": copied}
+
+# ------------- DB table conflicts ---------------
+# The game merges db\<table>\<fragment> files of all active packs row by row, so the real conflicts are rows
+# with the same key; the later mod in the order wins (same rule as merge_packs). Rows can only be decoded
+# with a schema: DB_SCHEMA_FILE maps table -> version -> [{"name", "type", "key"}]. Tables (or versions)
+# without one are compared per fragment file instead.
+
+DB_GUID_MARKER = b"\xfd\xfe\xfc\xff"
+DB_VERSION_MARKER = b"\xfc\xfd\xfe\xff"
+
+def _db_fixed(fmt):
+    size = struct.calcsize(fmt)
+    def read(data, pos):
+        return struct.unpack_from(fmt, data, pos)[0], pos + size
+    return read
+
+def _db_string_u8(data, pos):
+    (n,) = struct.unpack_from("<H", data, pos)
+    pos += 2
+    if pos + n > len(data):
+        raise ValueError("string runs past end of table")
+    return data[pos:pos + n].decode("utf-8", errors="replace"), pos + n
+
+def _db_string_u16(data, pos):
+    (n,) = struct.unpack_from("<H", data, pos)
+    pos += 2
+    if pos + 2 * n > len(data):
+        raise ValueError("string runs past end of table")
+    return data[pos:pos + 2 * n].decode("utf-16-le", errors="replace"), pos + 2 * n
+
+def _db_optional(read):
+    def read_optional(data, pos):
+        if pos >= len(data):
+            raise ValueError("row runs past end of table")
+        return read(data, pos + 1) if data[pos] else ("", pos + 1)
+    return read_optional
+
+DB_FIELD_READERS = {
+    "Boolean": _db_fixed("<?"),
+    "I16": _db_fixed("<h"),
+    "I32": _db_fixed("<i"),
+    "I64": _db_fixed("<q"),
+    "F32": _db_fixed("<f"),
+    "F64": _db_fixed("<d"),
+    "ColourRGB": _db_fixed("<I"),
+    "StringU8": _db_string_u8,
+    "StringU16": _db_string_u16,
+    "OptionalStringU8": _db_optional(_db_string_u8),
+    "OptionalStringU16": _db_optional(_db_string_u16),
+}
+
+_db_schema = None   # (mtime, schema)
+
+def load_db_schema(path=DB_SCHEMA_FILE):
+    """{table: {version: [field, ...]}} from DB_SCHEMA_FILE, or {} without one; reloaded when the file changes."""
+    global _db_schema
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return {}
+    if _db_schema is None or _db_schema[0] != mtime:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                _db_schema = (mtime, json.load(f))
+        except (OSError, ValueError):
+            _db_schema = (mtime, {})
+    return _db_schema[1]
+
+def parse_db_header(data):
+    """(version, offset of the first row, row count) of a DB table fragment."""
+    pos = 0
+    if data[:4] == DB_GUID_MARKER:
+        (n,) = struct.unpack_from("<H", data, 4)
+        pos = 6 + 2 * n
+    version = 0
+    if data[pos:pos + 4] == DB_VERSION_MARKER:
+        (version,) = struct.unpack_from("<I", data, pos + 4)
+        pos += 8
+    (rows,) = struct.unpack_from("<I", data, pos + 1)   # after a bool that is always 1
+    return version, pos + 5, rows
+
+def read_db_keys(data, fields):
+    """Row keys of one fragment: the "key" fields (or the first field) joined with "|"."""
+    _version, pos, rows = parse_db_header(data)
+    readers = [DB_FIELD_READERS[f["type"]] for f in fields]
+    key_cols = [i for i, f in enumerate(fields) if f.get("key")] or [0]
+    keys = []
+    for _ in range(rows):
+        row = []
+        for read in readers:
+            value, pos = read(data, pos)
+            row.append(value)
+        keys.append("|".join(str(row[i]) for i in key_cols))
+    if pos != len(data):
+        raise ValueError("schema does not match the table data")
+    return keys
+
+def _db_table_path(name):
+    """(table, fragment) for db/<table>/<fragment> entries (either slash), else None."""
+    parts = name.lower().replace("/", "\\").split("\\")
+    if len(parts) == 3 and parts[0] == "db" and parts[2]:
+        return parts[1], parts[2]
+    return None
+
+def list_db_tables(pack_path):
+    """{table: [fragment, ...]} from the pack index."""
+    try:
+        idx = read_pack_index(pack_path)
+    except ValueError:
+        return {}
+    tables = {}
+    for entry in idx.entries:
+        found = _db_table_path(entry.name)
+        if found:
+            tables.setdefault(found[0], []).append(found[1])
+    return tables
+
+def read_db_table_keys(pack_path, table, versions):
+    """
+    Sorted row keys of one table in one pack, decoded straight from a memory map of the pack.
+    None if a fragment has a version the schema does not describe or cannot be decoded with it.
+    """
+    idx = read_pack_index(pack_path)
+    keys = set()
+    with open(pack_path, "rb") as f:
+        if not idx.file_size:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for entry in idx.entries:
+                found = _db_table_path(entry.name)
+                if not found or found[0] != table:
+                    continue
+                try:
+                    data = read_pack_entry(f, idx, entry) if entry.compressed else mapped[entry.offset:entry.offset + entry.size]
+                    fields = versions.get(str(parse_db_header(data)[0]))
+                    if not fields:
+                        return None
+                    keys.update(read_db_keys(data, fields))
+                except (ValueError, KeyError, IndexError, struct.error, lzma.LZMAError):
+                    return None
+    return sorted(keys)
+
+# row keys can be large: kept out of PACK_CACHE_FILE, which every background scan rewrites
+_db_keys_cache = PackInfoCache(lambda: DB_KEYS_CACHE_FILE)
+
+class DbConflictAnalyzer:
+    """
+    Row-key collisions between packs, in load order. Each table's result is kept together with its
+    contributing packs (path, size, mtime), so after an order change only tables whose contributors
+    changed are recomputed; per-pack keys are cached in DB_KEYS_CACHE_FILE.
+    """
+
+    def __init__(self, schema=None, workers=None):
+        self.schema = schema
+        self.workers = workers or PACK_WORKERS
+        self._results = {}   # table -> (signature, conflicts)
+
+    def analyze(self, pack_paths):
+        """
+        {"conflicts": [{"table", "kind": "row"|"file", "key", "mods", "winner"}], "tables", "recomputed"}
+        for the packs in load order.
+        """
+        schema = load_db_schema() if self.schema is None else self.schema
+        tables = {}
+        for path in pack_paths:
+            try:
+                st = os.stat(path)
+                found = cached_pack_info(path, "db_tables", list_db_tables)
+            except OSError:
+                continue
+            for table, fragments in found.items():
+                tables.setdefault(table, []).append((path, st.st_size, st.st_mtime_ns, fragments))
+
+        shared = {t: c for t, c in tables.items() if len(c) > 1}
+        todo = []
+        for table, contributors in shared.items():
+            signature = (tuple(c[:3] for c in contributors), json.dumps(schema.get(table), sort_keys=True))
+            cached = self._results.get(table)
+            if not (cached and cached[0] == signature):
+                todo.append((table, contributors, signature))
+        if todo:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                for table, signature, conflicts in pool.map(lambda t: self._table(schema, *t), todo):
+                    self._results[table] = (signature, conflicts)
+            save_pack_cache()
+            _db_keys_cache.save()
+        for table in [t for t in self._results if t not in shared]:
+            del self._results[table]
+
+        conflicts = [c for table in sorted(shared) for c in self._results[table][1]]
+        return {"conflicts": conflicts, "tables": len(shared), "recomputed": len(todo)}
+
+    @staticmethod
+    def _table(schema, table, contributors, signature):
+        versions = schema.get(table)
+        tag = hashlib.sha1(json.dumps(versions, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+        rows = []
+        for path, _size, _mtime, _fragments in contributors:
+            keys = None
+            if versions:
+                try:
+                    keys = _db_keys_cache.get(path, f"{table}:{tag}",
+                                              lambda p: read_db_table_keys(p, table, versions))
+                except (OSError, ValueError):
+                    keys = None
+            if keys is None:
+                rows = None   # one undecodable pack: compare the whole table per fragment file
+                break
+            rows.append(keys)
+        owners = {}
+        for i, (path, _size, _mtime, fragments) in enumerate(contributors):
+            name = os.path.basename(path)
+            entries = [("file", f) for f in fragments] if rows is None else [("row", k) for k in rows[i]]
+            for entry in entries:
+                mods = owners.setdefault(entry, [])
+                if not mods or mods[-1] != name:
+                    mods.append(name)
+        conflicts = [{"table": table, "kind": kind, "key": key, "mods": mods, "winner": mods[-1]}
+                     for (kind, key), mods in sorted(owners.items()) if len(mods) > 1]
+        return table, signature, conflicts
+
+# ------------- mod list export / import ---------------
+# <name>.modlist.json: the ordered active mods with size and sha256, so another machine can check its
+# collection against it and copy what is missing from an archive folder or .zip.
+
+MODLIST_FORMAT = "wh2mm-modlist"
+MODLIST_VERSION = 1
+MODLIST_SUFFIX = ".modlist.json"
+
+def _hash_packs(paths, workers=None):
+    def digest(path):
+        try:
+            return path, cached_pack_info(path, "sha256", file_sha256)
+        except OSError:
+            return path, None
+    with ThreadPoolExecutor(max_workers=workers or PACK_WORKERS) as pool:
+        return dict(pool.map(digest, paths))
+
+@traced("io.export_modlist")
+def export_modlist(order, game_path, dest):
+    """Write the mod list for order to dest; returns the number of mods written."""
+    paths = [mod_path(game_path, m) for m in order]
+    hashes = _hash_packs(paths)
+    save_pack_cache()
+    mods = []
+    for name, path in zip(order, paths):
+        if hashes.get(path):
+            mods.append({"name": name, "size": os.path.getsize(path), "sha256": hashes[path]})
+    payload = {"format": MODLIST_FORMAT, "version": MODLIST_VERSION, "mods": mods}
+    safe_write_lines(os.path.abspath(dest), [json.dumps(payload, ensure_ascii=False, separators=(",", ":"))])
+    return len(mods)
+
+def is_plain_pack_name(name):
+    """True for a bare "<name>.pack" file name (no folders, no "..", not absolute)."""
+    return (isinstance(name, str) and name.lower().endswith(".pack") and os.path.basename(name) == name
+            and not any(sep in name for sep in ("/", "\\")) and ".." not in name and not os.path.isabs(name))
+
+def read_modlist(path):
+    """
+    Entries {"name", "size", "sha256"} in load order; ValueError for anything that is not a mod list
+    or names a file outside data/.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or data.get("format") != MODLIST_FORMAT:
+        raise ValueError("not a mod list file")
+    version = data.get("version", 0)
+    if not isinstance(version, int) or isinstance(version, bool):
+        raise ValueError("invalid mod list version")
+    if version > MODLIST_VERSION:
+        raise ValueError("mod list from a newer version of the manager")
+    mods = data.get("mods", [])
+    if not isinstance(mods, list):
+        raise ValueError('"mods" must be a list')
+    entries = [m for m in mods if isinstance(m, dict) and isinstance(m.get("name"), str)]
+    for m in entries:
+        if not is_plain_pack_name(m["name"]):
+            raise ValueError(f"invalid mod name in mod list: {m['name']!r}")
+    return entries
+
+@traced("io.check_modlist")
+def check_modlist(entries, game_path, workers=None):
+    """Each entry plus "status": "ok", "mismatch" (other version installed) or "missing"; checked in parallel."""
+    def check(entry):
+        path = mod_path(game_path, entry["name"])
+        try:
+            if os.path.getsize(path) != entry.get("size"):
+                return dict(entry, status="mismatch")
+            digest = cached_pack_info(path, "sha256", file_sha256)
+        except OSError:
+            return dict(entry, status="missing")
+        return dict(entry, status="ok" if digest == entry.get("sha256") else "mismatch")
+    with ThreadPoolExecutor(max_workers=workers or PACK_WORKERS) as pool:
+        results = list(pool.map(check, entries))
+    save_pack_cache()
+    return results
+
+def _archive_packs(archive):
+    """{size: [(file_name, path_or_zip_member)]} for the .pack files in an archive folder (recursive) or .zip."""
+    found = {}
+    if os.path.isfile(archive):
+        with zipfile.ZipFile(archive) as z:
+            for info in z.infolist():
+                name = os.path.basename(info.filename)
+                if name.lower().endswith(".pack"):
+                    found.setdefault(info.file_size, []).append((name, info.filename))
+        return found
+    for root, _dirs, files in os.walk(archive):
+        for name in files:
+            if name.lower().endswith(".pack"):
+                path = os.path.join(root, name)
+                found.setdefault(os.path.getsize(path), []).append((name, path))
+    return found
+
+@traced("io.restore_from_archive")
+def restore_from_archive(entries, archive, game_path, workers=4):
+    """
+    Copy the packs of the given mod list entries from an archive folder or .zip into data/. Candidates are
+    matched by size and sha256 (a file with the same name is tried first). Returns the restored names.
+    """
+    data_path = os.path.join(game_path, "data")
+    os.makedirs(data_path, exist_ok=True)
+    candidates = _archive_packs(archive)
+    from_zip = os.path.isfile(archive)
+
+    def extract(member, entry, dest):
+        tmp = dest + ".part"
+        h = hashlib.sha256()
+        try:
+            with zipfile.ZipFile(archive) as z, z.open(member) as src, open(tmp, "wb") as dst:
+                for chunk in iter(lambda: src.read(1024 * 1024), b""):
+                    h.update(chunk)
+                    dst.write(chunk)
+            if h.hexdigest() != entry.get("sha256"):
+                return False
+            os.replace(tmp, dest)
+            return True
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def restore(entry):
+        if not is_plain_pack_name(entry["name"]):
+            return None
+        dest = os.path.join(data_path, entry["name"])
+        options = sorted(candidates.get(entry.get("size"), []), key=lambda c: c[0] != entry["name"])
+        for _name, source in options:
+            try:
+                if from_zip:
+                    if extract(source, entry, dest):
+                        return entry["name"]
+                elif cached_pack_info(source, "sha256", file_sha256) == entry.get("sha256"):
+                    replace_file_copy(source, dest)
+                    return entry["name"]
+            except (OSError, zipfile.BadZipFile):
+                continue
+        return None
+
+    if not entries:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(entries)))) as pool:
+        restored = [name for name in pool.map(restore, entries) if name]
+    save_pack_cache()
+    return restored
+
+@traced("io.import_modlist")
+def import_modlist(path, game_path, archive=None):
+    """
+    Check the collection against a mod list and, with an archive, restore the missing packs.
+    Returns the entries with "status": "ok", "restored", "mismatch" or "missing".
+    """
+    results = check_modlist(read_modlist(path), game_path)
+    missing = [r for r in results if r["status"] == "missing"]
+    if archive and missing:
+        restored = set(restore_from_archive(missing, archive, game_path))
+        for r in results:
+            if r["name"] in restored:
+                r["status"] = "restored"
+    return results
+
+# ------------- updates from a mirror folder ---------------
+# An installed pack is rebuilt from the mirror's version: entries whose bytes the installed pack already has
+# (same size and hash, wherever they sit in the file) are copied locally, only the rest comes from the mirror.
+
+def _entry_digest(f, entry):
+    h = hashlib.blake2b(digest_size=16)
+    f.seek(entry.offset)
+    left = entry.size
+    while left:
+        chunk = f.read(min(left, 1024 * 1024))
+        if not chunk:
+            break
+        h.update(chunk)
+        left -= len(chunk)
+    return h.digest()
+
+@traced("io.update_pack")
+def update_pack(installed_path, mirror_path):
+    """
+    Replace installed_path with the contents of mirror_path, reusing the entries it already has.
+    Returns {"bytes_total", "bytes_transferred", "added", "removed", "modified"} (entry names).
+    Raises ValueError if the mirror file is not a readable pack.
+    """
+    new_idx = read_pack_index(mirror_path)
+    try:
+        old_idx = read_pack_index(installed_path)
+        old_entries = old_idx.entries
+    except ValueError:
+        old_entries = []   # damaged install: everything comes from the mirror
+    old_by_name = {e.name.lower(): e for e in old_entries}
+    old_by_size = {}
+    for e in old_entries:
+        old_by_size.setdefault(e.size, []).append(e)
+
+    plan = [["new", 0, new_idx.data_offset]]   # [source, offset, size], adjacent ranges merged
+    added, modified = [], []
+    old_digests = {}
+    with open(installed_path, "rb") as old_f, open(mirror_path, "rb") as new_f:
+        for e in new_idx.entries:
+            same_name = old_by_name.get(e.name.lower())
+            match = None
+            digest = None
+            candidates = old_by_size.get(e.size, []) if e.size else []
+            if candidates:
+                digest = _entry_digest(new_f, e)
+                if same_name in candidates:
+                    candidates = [same_name] + [c for c in candidates if c is not same_name]
+                for c in candidates:
+                    if c.offset not in old_digests:
+                        old_digests[c.offset] = _entry_digest(old_f, c)
+                    if old_digests[c.offset] == digest:
+                        match = c
+                        break
+            if same_name is None:
+                added.append(e.name)
+            elif same_name.size != e.size or (e.size and old_digests.get(same_name.offset) != digest):
+                modified.append(e.name)
+            source, offset = ("old", match.offset) if match else ("new", e.offset)
+            last = plan[-1]
+            if last[0] == source and last[1] + last[2] == offset:
+                last[2] += e.size
+            else:
+                plan.append([source, offset, e.size])
+    new_names = {e.name.lower() for e in new_idx.entries}
+    removed = [e.name for e in old_entries if e.name.lower() not in new_names]
+
+    st = os.stat(mirror_path)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(installed_path), suffix=".tmp")
+    fds = {}
+    maps = {}
+    transferred = 0
+    try:
+        try:
+            for source, path in (("old", installed_path), ("new", mirror_path)):
+                fds[source] = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+                size = os.fstat(fds[source]).st_size
+                maps[source] = mmap.mmap(fds[source], 0, access=mmap.ACCESS_READ) if size else b""
+            pos = 0
+            for source, offset, size in plan:
+                if size:
+                    _copy_range(fds[source], maps[source], fd, offset, size, pos)
+                pos += size
+                if source == "new":
+                    transferred += size
+            if pos != st.st_size:
+                raise ValueError(f"{os.path.basename(mirror_path)}: index does not cover the file")
+        finally:
+            for m in maps.values():
+                if isinstance(m, mmap.mmap):
+                    m.close()
+            for src_fd in fds.values():
+                os.close(src_fd)
+            os.close(fd)
+        os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+        os.replace(tmp, installed_path)
+    except Exception:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return {"bytes_total": st.st_size, "bytes_transferred": transferred,
+            "added": added, "removed": removed, "modified": modified}
+
+@traced("io.update_mods_from_mirror")
+def _has_pfh_magic(path):
+    with open(path, "rb") as f:
+        return f.read(3) == b"PFH"
+
+def update_mods_from_mirror(game_path, mirror_dir, workers=4):
+    """
+    Update every data/ pack that also exists in mirror_dir and differs from it (size, mtime, sha256).
+    Returns one report per pack: {"name", "status": "updated"|"unchanged"|"error", "bytes_total",
+    "bytes_transferred", "added", "removed", "modified", "error"}.
+    """
+    data_path = os.path.join(game_path, "data")
+    names = sorted(f for f in os.listdir(mirror_dir)
+                   if f.lower().endswith(".pack") and os.path.isfile(os.path.join(data_path, f)))
+
+    def update(name):
+        src = os.path.join(mirror_dir, name)
+        dest = os.path.join(data_path, name)
+        report = {"name": name, "status": "unchanged", "bytes_total": 0, "bytes_transferred": 0,
+                  "added": [], "removed": [], "modified": [], "error": None}
+        try:
+            report["bytes_total"] = os.path.getsize(src)
+            if _same_file_content(src, dest):
+                return report
+            try:
+                report.update(update_pack(dest, src))
+            except ValueError as ex:
+                if _has_pfh_magic(src):
+                    # a damaged (e.g. truncated) pack in the mirror must not replace a working install
+                    report["status"] = "error"
+                    report["error"] = str(ex)
+                    return report
+                replace_file_copy(src, dest)   # not a pack format we parse: plain copy
+                report["bytes_transferred"] = report["bytes_total"]
+            report["status"] = "updated"
+            png = os.path.splitext(src)[0] + ".png"
+            dest_png = os.path.splitext(dest)[0] + ".png"
+            if os.path.exists(png) and not _same_file_content(png, dest_png):
+                replace_file_copy(png, dest_png)
+        except OSError as ex:
+            report["status"] = "error"
+            report["error"] = str(ex)
+        return report
+
+    if not names:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(names)))) as pool:
+        return list(pool.map(update, names))
+
+# ------------- page-cache warmup ---------------
+
+WARMUP_BUDGET_MB = 4096          # default for config.json "warmup_budget_mb"; 0 turns warmup off
+WARMUP_MIN_FREE_MB = 512         # below this much free RAM further reads would evict other cached data
+WARMUP_CHUNK = 1024 * 1024
+WARMUP_WORKERS = 4
+WARMUP_ADVISE_STEP = 16 * WARMUP_CHUNK   # fadvise returns at once: advise this much, then let the kernel read it
+WARMUP_ADVISE_PAUSE = 0.05               # seconds per step, caps the advise rate at ~320 MB/s (about disk speed)
+
+_pdh_free_counter = None   # (query, counter) handles, False once opening them failed
+
+def _windows_free_pages():
+    """
+    Bytes on the free and zero page lists, from the "Memory" performance counters. Unlike
+    MEMORYSTATUSEX.ullAvailPhys this excludes the standby list, i.e. the file cache the warmup fills.
+    """
+    global _pdh_free_counter
+    pdh = ctypes.windll.pdh
+    if _pdh_free_counter is None:
+        query = ctypes.c_void_p()
+        counter = ctypes.c_void_p()
+        if (pdh.PdhOpenQueryW(None, None, ctypes.byref(query)) != 0
+                or pdh.PdhAddEnglishCounterW(query, "\\Memory\\Free & Zero Page List Bytes", None,
+                                             ctypes.byref(counter)) != 0):
+            _pdh_free_counter = False
+        else:
+            _pdh_free_counter = (query, counter)
+    if not _pdh_free_counter:
+        return None
+
+    class PDH_FMT_COUNTERVALUE(ctypes.Structure):
+        _fields_ = [("CStatus", ctypes.c_ulong), ("largeValue", ctypes.c_longlong)]
+
+    PDH_FMT_LARGE = 0x00000400
+    query, counter = _pdh_free_counter
+    value = PDH_FMT_COUNTERVALUE()
+    if (pdh.PdhCollectQueryData(query) != 0
+            or pdh.PdhGetFormattedCounterValue(counter, PDH_FMT_LARGE, None, ctypes.byref(value)) != 0):
+        return None
+    return value.largeValue
+
+def free_memory():
+    """
+    Free physical memory in bytes that is not even used as file cache, or None if unknown
+    (then only the warmup budget limits the warmup).
+    """
+    if sys.platform.startswith("linux"):
+        try:
+            with open("/proc/meminfo", "r", encoding="ascii") as f:
+                for ln in f:
+                    if ln.startswith("MemFree:"):
+                        return int(ln.split()[1]) * 1024
+        except (OSError, ValueError):
+            return None
+    elif sys.platform == "win32":
+        try:
+            return _windows_free_pages()
+        except (OSError, AttributeError):
+            return None
+    return None
+
+class PackWarmup:
+    """
+    Pulls the active packs into the OS page cache in load order while the game starts.
+    Uses posix_fadvise(WILLNEED) where available and parallel sequential reads otherwise.
+    Stops at budget_bytes, on cancel(), or once free memory drops below min_free_bytes
+    (from there on every warmed page would evict something else). fadvise only queues the reads, so it is
+    issued in WARMUP_ADVISE_STEP pieces with a pause and a free-memory check after each one.
+    """
+
+    def __init__(self, paths, budget_bytes, min_free_bytes=WARMUP_MIN_FREE_MB * 1024 * 1024, workers=WARMUP_WORKERS):
+        self.paths = list(paths)
+        self.budget = budget_bytes
+        self.min_free = min_free_bytes
+        self.workers = workers
+        self.warmed = 0
+        self.stop_reason = None
+        self._checked_at = None   # self.warmed at the last free-memory check
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="PackWarmup", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    def wait(self, timeout=None):
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def _claim(self, n, check_memory=False):
+        """Reserve n bytes of the budget; returns how many may actually be warmed (0 = stop)."""
+        with self._lock:
+            if self.stop_reason:
+                return 0
+            if self._cancel.is_set():
+                self.stop_reason = "cancelled"
+                return 0
+            if self.warmed >= self.budget:
+                self.stop_reason = "budget"
+                return 0
+            if check_memory or self._checked_at is None or self.warmed - self._checked_at >= 64 * WARMUP_CHUNK:
+                self._checked_at = self.warmed
+                free = free_memory()
+                if free is not None and free - 64 * WARMUP_CHUNK < self.min_free:
+                    self.stop_reason = "memory"
+                    return 0
+            n = min(n, self.budget - self.warmed)
+            self.warmed += n
+            return n
+
+    def _advise(self, path):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            size = os.fstat(fd).st_size
+            offset = 0
+            while offset < size:
+                n = self._claim(min(WARMUP_ADVISE_STEP, size - offset), check_memory=True)
+                if not n:
+                    return
+                os.posix_fadvise(fd, offset, n, os.POSIX_FADV_WILLNEED)
+                offset += n
+                # give the kernel time to actually read the step before free memory is looked at again
+                if self._cancel.wait(WARMUP_ADVISE_PAUSE):
+                    return
+        finally:
+            os.close(fd)
+
+    def _read(self, path):
+        buf = bytearray(WARMUP_CHUNK)
+        with open(path, "rb", buffering=0) as f:
+            while True:
+                n = self._claim(WARMUP_CHUNK)
+                if not n:
+                    return
+                got = f.readinto(memoryview(buf)[:n])
+                if not got:
+                    with self._lock:
+                        self.warmed -= n
+                    return
+                if got < n:
+                    with self._lock:
+                        self.warmed -= n - got
+
+    def _run(self):
+        try:
+            if hasattr(os, "posix_fadvise"):
+                for path in self.paths:
+                    if self.stop_reason:
+                        break
+                    try:
+                        self._advise(path)
+                    except OSError:
+                        continue
+            else:
+                # lower load-order positions are submitted first, so they are warmed first
+                with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                    for fut in [pool.submit(self._read, p) for p in self.paths]:
+                        try:
+                            fut.result()
+                        except OSError:
+                            continue
+        finally:
+            if not self.stop_reason:
+                self.stop_reason = "done"
+
+# ------------- filesystem watcher ---------------
+
+WATCH_DEBOUNCE = 0.5        # seconds of quiet before a burst of events is delivered
+WATCH_POLL_INTERVAL = 2.0   # stat-polling period for the fallback watcher
+
+class _Watcher:
+    """
+    Base for the watcher backends. Collects changed file names per watched directory
+    and calls on_change({dir: {names}}) from the watcher thread once events stop for `debounce` seconds.
+    An exception from on_change goes to on_error(ex), and the watcher keeps running; without on_error it
+    propagates and ends the watcher thread.
+    """
+
+    def __init__(self, dirs, on_change, debounce=WATCH_DEBOUNCE, on_error=None):
+        self.dirs = list(dirs)
+        self.on_change = on_change
+        self.on_error = on_error
+        self.debounce = debounce
+        self._pending = {}
+        self._last_event = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=type(self).__name__, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _add(self, dirn, name):
+        self._pending.setdefault(dirn, set()).add(name)
+        self._last_event = time.monotonic()
+
+    def _maybe_flush(self):
+        if not self._pending or time.monotonic() - self._last_event < self.debounce:
+            return
+        changes, self._pending = self._pending, {}
+        try:
+            self.on_change(changes)
+        except Exception as ex:
+            if self.on_error is None:
+                raise
+            self.on_error(ex)
+
+    def _run(self):
+        raise NotImplementedError
+
+
+class PollingWatcher(_Watcher):
+    """Fallback backend: compares (size, mtime) snapshots of the watched directories."""
+
+    def __init__(self, dirs, on_change, debounce=WATCH_DEBOUNCE, on_error=None, interval=WATCH_POLL_INTERVAL):
+        super().__init__(dirs, on_change, debounce, on_error)
+        self.interval = interval
+
+    @staticmethod
+    def _snapshot(dirn):
+        snap = {}
+        try:
+            with os.scandir(dirn) as it:
+                for entry in it:
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    snap[entry.name] = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            pass
+        return snap
+
+    def _run(self):
+        snaps = {d: self._snapshot(d) for d in self.dirs}
+        while not self._stop.wait(min(self.interval, self.debounce) if self._pending else self.interval):
+            for d in self.dirs:
+                new = self._snapshot(d)
+                old = snaps[d]
+                for name in old.keys() | new.keys():
+                    if old.get(name) != new.get(name):
+                        self._add(d, name)
+                snaps[d] = new
+            self._maybe_flush()
+
+
+class InotifyWatcher(_Watcher):
+    """Linux backend on top of inotify(7) via ctypes."""
+
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self, dirs, on_change, debounce=WATCH_DEBOUNCE, on_error=None):
+        super().__init__(dirs, on_change, debounce, on_error)
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._wds = {}
+        for d in self.dirs:
+            if not os.path.isdir(d):
+                continue
+            wd = libc.inotify_add_watch(self._fd, os.fsencode(d), self.MASK)
+            if wd < 0:
+                os.close(self._fd)
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {d}")
+            self._wds[wd] = d
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                ready, _, _ = select.select([self._fd], [], [], self.debounce if self._pending else 1.0)
+                if ready:
+                    try:
+                        buf = os.read(self._fd, 64 * 1024)
+                    except BlockingIOError:
+                        continue
+                    off = 0
+                    while off + self.EVENT.size <= len(buf):
+                        wd, _mask, _cookie, length = self.EVENT.unpack_from(buf, off)
+                        off += self.EVENT.size
+                        name = buf[off:off + length].rstrip(b"\0")
+                        off += length
+                        if wd in self._wds and name:
+                            self._add(self._wds[wd], os.fsdecode(name))
+                self._maybe_flush()
+        finally:
+            os.close(self._fd)
+
+
+def start_watcher(dirs, on_change, debounce=WATCH_DEBOUNCE, on_error=None):
+    """Watch `dirs` with inotify on Linux, stat polling elsewhere (or if inotify is unavailable)."""
+    dirs = list(dict.fromkeys(os.path.abspath(d) for d in dirs))
+    watcher = None
+    if sys.platform.startswith("linux"):
+        try:
+            watcher = InotifyWatcher(dirs, on_change, debounce, on_error)
+        except (OSError, AttributeError, TypeError):
+            watcher = None
+    if watcher is None:
+        watcher = PollingWatcher(dirs, on_change, debounce, on_error)
+    return watcher.start()
+
+# ------------- JSON-RPC server ---------------
+# Line-delimited JSON-RPC 2.0 for scripts that drive a running manager (python main.py --serve [ADDRESS]).
+# The handlers are the GUI's own operations, so requests work on the in-memory state instead of rescanning.
+# Over TCP every request must carry "token" (a new one per session, in RPC_TOKEN_FILE, readable by the user
+# only): any web page can reach a localhost port. A unix socket is protected by its file mode instead.
+
+RPC_DEFAULT_ADDRESS = "127.0.0.1:47632"
+RPC_MAX_LINE = 16 * 1024 * 1024
+RPC_PARSE_ERROR = -32700
+RPC_INVALID_REQUEST = -32600
+RPC_METHOD_NOT_FOUND = -32601
+RPC_INVALID_PARAMS = -32602
+RPC_INTERNAL_ERROR = -32603
+RPC_UNAUTHORIZED = -32001
+RPC_TOKEN_FILE = "rpc_token.txt"
+
+RPC_ADDRESS = None   # set by --serve
+
+class RpcError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+def write_private_file(path, text):
+    """Create or replace a file readable only by the current user (mode 0600)."""
+    if os.path.exists(path):
+        os.remove(path)   # O_CREAT keeps the mode of an existing file
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(text)
+
+def _rpc_error(request_id, code, message):
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+class RpcServer:
+    """
+    Serves methods = {name: (callable(params) -> result, writes)} on "host:port" (localhost TCP) or
+    "unix:/path". Handlers run on a thread pool: reads concurrently, writes one at a time.
+    TCP requests need the session token (self.token, also written to token_file).
+    """
+
+    def __init__(self, address, methods, workers=8, token_file=RPC_TOKEN_FILE):
+        self.address = address
+        self.methods = methods
+        self.token = None if address.startswith("unix:") else secrets.token_urlsafe(32)
+        self.token_file = token_file
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.loop = None
+        self.error = None
+        self._server = None
+        self._write_lock = None
+        self._ready = threading.Event()
+
+    def start(self, timeout=5):
+        if self.token:
+            write_private_file(self.token_file, self.token + "\n")
+        threading.Thread(target=self._run, daemon=True, name="rpc").start()
+        self._ready.wait(timeout)
+        if self.error:
+            self.stop()   # also removes the token file nobody can use
+            raise self.error
+        return self
+
+    def stop(self):
+        if self.loop is not None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        self.pool.shutdown(wait=False)
+        if self.token:
+            try:
+                os.remove(self.token_file)
+            except OSError:
+                pass
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self._server = self.loop.run_until_complete(self._listen())
+            if not self.address.startswith("unix:"):
+                host, port = self._server.sockets[0].getsockname()[:2]
+                self.address = f"{host}:{port}"   # the real port when started on port 0
+        except OSError as ex:
+            self.error = ex
+            self._ready.set()
+            self.loop.close()
+            return
+        self._write_lock = asyncio.Lock()
+        self._ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self._server.close()
+            self.loop.run_until_complete(self._server.wait_closed())
+            self.loop.close()
+
+    async def _listen(self):
+        if self.address.startswith("unix:"):
+            path = self.address[len("unix:"):]
+            if os.path.exists(path):
+                os.remove(path)
+            old_umask = os.umask(0o177)   # socket only for this user
+            try:
+                return await asyncio.start_unix_server(self._client, path=path, limit=RPC_MAX_LINE)
+            finally:
+                os.umask(old_umask)
+        host, _, port = self.address.rpartition(":")
+        return await asyncio.start_server(self._client, host or "127.0.0.1", int(port), limit=RPC_MAX_LINE)
 
-    write_user_script_lines(out)
-    return True
+    async def _client(self, reader, writer):
+        trusted = self.token is None   # over TCP: once a request carried the right token
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    await self._send(writer, _rpc_error(None, RPC_PARSE_ERROR, "parse error"))
+                    if not trusted:
+                        break   # not a JSON-RPC client (e.g. an HTTP request from a browser): hang up
+                    continue
+                batch = request if isinstance(request, list) else [request]
+                if not all(self._authorized(r) for r in batch):
+                    await self._send(writer, _rpc_error(None, RPC_UNAUTHORIZED, "missing or wrong token"))
+                    break
+                trusted = True
+                if isinstance(request, list):
+                    responses = await asyncio.gather(*(self._call(r) for r in request))
+                    response = [r for r in responses if r is not None] or None
+                else:
+                    response = await self._call(request)
+                if response is not None:
+                    await self._send(writer, response)
+        except (ConnectionError, ValueError):
+            pass   # client went away or sent an over-long line
+        finally:
+            writer.close()
 
-# ------------- pack/zip add/delete ---------------
+    def _authorized(self, request):
+        if self.token is None:
+            return True
+        token = request.get("token") if isinstance(request, dict) else None
+        return isinstance(token, str) and hmac.compare_digest(token.encode("utf-8"), self.token.encode("utf-8"))
 
-def add_pack_file(pack_path, game_path):
-    data_path = os.path.join(game_path, "data")
-    os.makedirs(data_path, exist_ok=True)
-    dest = os.path.join(data_path, os.path.basename(pack_path))
-    if not os.path.exists(dest):
-        shutil.copy(pack_path, dest)
-    png_candidate = os.path.splitext(pack_path)[0] + ".png"
-    if os.path.exists(png_candidate):
-        dest_png = os.path.join(data_path, os.path.basename(png_candidate))
-        if not os.path.exists(dest_png):
-            shutil.copy(png_candidate, dest_png)
+    @staticmethod
+    async def _send(writer, response):
+        writer.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+        await writer.drain()
 
-def add_zip_archive(zip_path, game_path):
-    data_path = os.path.join(game_path, "data")
-    os.makedirs(data_path, exist_ok=True)
-    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-        for member in zip_ref.namelist():
-            filename = os.path.basename(member)
-            if not filename:
-                continue
-            if filename.lower().endswith(".pack") or filename.lower().endswith(".png"):
-                target_path = os.path.join(data_path, filename)
-                with zip_ref.open(member) as src, open(target_path, "wb") as dst:
-                    shutil.copyfileobj(src, dst)
+    async def _call(self, request):
+        if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+            return _rpc_error(request.get("id") if isinstance(request, dict) else None,
+                              RPC_INVALID_REQUEST, "invalid request")
+        request_id = request.get("id")
+        name = request["method"]
+        params = request.get("params") or {}
+        if name not in self.methods:
+            response = _rpc_error(request_id, RPC_METHOD_NOT_FOUND, f"unknown method {name}")
+        elif not isinstance(params, dict):
+            response = _rpc_error(request_id, RPC_INVALID_PARAMS, "params must be an object")
+        else:
+            fn, writes = self.methods[name]
+            try:
+                if writes:
+                    async with self._write_lock:
+                        result = await self.loop.run_in_executor(self.pool, self._invoke, name, fn, params)
+                else:
+                    result = await self.loop.run_in_executor(self.pool, self._invoke, name, fn, params)
+            except RpcError as ex:
+                response = _rpc_error(request_id, ex.code, ex.message)
+            except Exception as ex:
+                response = _rpc_error(request_id, RPC_INTERNAL_ERROR, str(ex))
+            else:
+                response = {"jsonrpc": "2.0", "id": request_id, "result": result}
+        return response if "id" in request else None   # notifications get no reply
 
-def delete_mod_files(mod_name, game_path):
-    data_path = os.path.join(game_path, "data")
-    mod_path = os.path.join(data_path, mod_name)
-    png_path = os.path.join(data_path, os.path.splitext(mod_name)[0] + ".png")
-    if os.path.exists(mod_path):
-        os.remove(mod_path)
-    if os.path.exists(png_path):
-        os.remove(png_path)
+    @staticmethod
+    def _invoke(name, fn, params):
+        if not TRACER.enabled:
+            return fn(params)
+        with TRACER.span(f"rpc.{name}"):
+            return fn(params)
 
 
 # ---------------- UI / main ----------------
 
+SELECTED_COLOR = "#37474F"
+
 def main(page: ft.Page):
     page.title = "Total War: Warhammer II — Mod Manager"
     page.window.width = 900
@@ -244,6 +2933,59 @@ def main(page: ft.Page):
             "saved": "Сохранено ✅",
             "refreshed": "Список модов обновлён 🔄",
             "game_launched": "Игра запущена 🎮",
+            "warmup_started": "Игра запущена 🎮, моды подгружаются в кэш ({} МБ максимум)",
+            "warmup_stop": "Остановить",
+            "merge_selected": "Объединить выбранные моды в один .pack",
+            "merge_name": "Имя объединённого мода",
+            "merge_done": "{} модов объединено в {} ✅",
+            "merge_updated": "{} пересобран ({} файлов обновлено)",
+            "merge_need_two": "Выберите хотя бы два активных мода",
+            "merge_error": "Не удалось объединить моды: {}",
+            "merge_name_taken": "Мод {} уже есть — выберите другое имя",
+            "rpc_failed_title": "JSON-RPC не запущен",
+            "rpc_failed": "Не удалось запустить сервер --serve на {}: {}",
+            "broken_pack": "Повреждённый мод, включить нельзя: {}",
+            "workshop_mod": "Мод из Steam Workshop — удаляется отпиской в Steam",
+            "install": "Установка игры",
+            "push_installs": "Применить порядок к другим установкам",
+            "push_source": "Что применить",
+            "current_order": "Текущий порядок",
+            "apply": "Применить",
+            "push_ok": "{}: ✅ включено модов: {}",
+            "push_missing": "{}: ⚠ включено модов: {}, нет в этой установке: {}",
+            "push_failed": "{}: ❌ {}",
+            "push_shared": "{}: ⚠ пропущено — та же папка скриптов, что у {} (применяется только к ней)",
+            "push_same_scripts": "Та же папка скриптов, что у текущей установки: применение перезаписало бы её порядок",
+            "update_mods": "📥 Обновить моды из папки",
+            "choose_mirror": "Выберите папку с новыми версиями модов",
+            "update_none": "Обновлений нет: все моды совпадают с папкой",
+            "update_line": "{}: обновлён, прочитано {} из {} МБ; файлы: +{} −{} ~{}",
+            "update_failed": "{}: ❌ {}",
+            "category": "Категория",
+            "cat_all": "Все",
+            "cat_db": "Юниты и таблицы БД",
+            "cat_scripts": "Скрипты",
+            "cat_ui": "Интерфейс",
+            "cat_maps": "Карты",
+            "cat_models": "Модели и текстуры",
+            "cat_audio": "Звук",
+            "cat_localisation": "Только локализация",
+            "cat_other": "Прочее",
+            "export_modlist": "Экспорт списка модов (с проверочными суммами)",
+            "import_modlist": "Импорт списка модов",
+            "modlist_file": "Список модов",
+            "modlist_saved": "Список модов сохранён: {} модов ✅",
+            "choose_archive": "Папка с архивом модов для восстановления недостающих (можно отменить)",
+            "import_ok": "Совпадают: {}",
+            "import_restored": "Восстановлены из архива: {}",
+            "import_mismatch": "Другая версия: {}",
+            "import_missing": "Не найдены: {}",
+            "import_error": "Не удалось импортировать список: {}",
+            "db_conflicts": "Конфликты строк в таблицах БД",
+            "db_no_conflicts": "Конфликтов в таблицах БД нет ({} общих таблиц проверено)",
+            "db_conflict_row": "{}: ключ «{}» — {} → побеждает {}",
+            "db_conflict_file": "{}: файл {} целиком — {} → побеждает {} (нет схемы таблицы)",
+            "db_conflicts_more": "… и ещё {}",
             "game_not_found": "Файл не найден: {}",
             "game_folder_not_set_short": "Папка с игрой не указана!",
             "choose_mods": "Выберите моды (.pack или .zip)",
@@ -251,6 +2993,61 @@ def main(page: ft.Page):
             "move_up": "Поднять",
             "move_down": "Опустить",
             "backup_error": "Ошибка при создании резервной копии: {}",
+            "watch_error": "Не удалось применить изменения в папке игры: {}",
+            "search": "Поиск модов…",
+            "selected": "Выбрано: {}",
+            "enable_selected": "Включить выбранные",
+            "disable_selected": "Выключить выбранные",
+            "move_top": "В начало списка",
+            "move_bottom": "В конец списка",
+            "position": "№",
+            "move_to_position": "Переместить выбранные на позицию №",
+            "delete_selected": "Удалить выбранные",
+            "select_all": "Выбрать все видимые",
+            "clear_selection": "Снять выделение",
+            "confirm_delete": "Удалить выбранные моды ({})?",
+            "yes": "Да",
+            "no": "Нет",
+            "cancel": "Отмена",
+            "undo": "Отменить (Ctrl+Z)",
+            "backups": "Резервные копии",
+            "backup_diff": "Сравнить с текущими",
+            "backup_restore": "Восстановить",
+            "backup_restored": "Резервная копия восстановлена ✅",
+            "no_backups": "Резервных копий пока нет",
+            "trash": "Корзина",
+            "trash_empty_list": "Корзина пуста",
+            "mods_trashed": "Перенесено в корзину: {}",
+            "trash_undo": "Вернуть",
+            "trash_restore": "Восстановить",
+            "trash_restored": "Мод {} восстановлен из корзины",
+            "trash_restore_error": "Не удалось восстановить {}: {}",
+            "trash_empty": "Очистить корзину",
+            "trash_purged": "Корзина очищена: {} шт., {:.1f} МБ",
+            "gc": "Очистка мусора в data/",
+            "gc_nothing": "Мусора не найдено",
+            "gc_previews": "Превью без мода: {}",
+            "gc_manifests": "Файлы объединения без мода: {}",
+            "gc_temp": "Временные файлы: {}",
+            "gc_script_lines": "Строки user.script без мода: {}",
+            "gc_cache": "Записи кэша без файла: {}",
+            "gc_total": "Можно освободить: {:.1f} МБ",
+            "gc_clean": "Очистить",
+            "gc_done": "Очистка завершена, освобождено {:.1f} МБ",
+            "no_changes": "Отличий нет",
+            "close": "Закрыть",
+            "debug": "Отладка: задержки",
+            "export_json": "Экспорт JSON",
+            "export_chrome": "Экспорт Chrome trace",
+            "exported": "Сохранено: {}",
+            "redo": "Повторить (Ctrl+Y)",
+            "profile": "Профиль",
+            "save_profile": "Сохранить текущий порядок как профиль",
+            "delete_profile": "Удалить профиль",
+            "profile_name": "Название профиля",
+            "profile_saved": "Профиль «{}» сохранён ✅",
+            "profile_applied": "Профиль «{}» применён ✅",
+            "profile_missing": "Профиль «{}» применён, не найдено модов: {}",
         },
         "en": {
             "title": "Total War: Warhammer II — Mod Manager",
@@ -266,6 +3063,59 @@ def main(page: ft.Page):
             "saved": "Saved ✅",
             "refreshed": "Mod list refreshed 🔄",
             "game_launched": "Game launched 🎮",
+            "warmup_started": "Game launched 🎮, warming up mods in the cache (up to {} MB)",
+            "warmup_stop": "Stop",
+            "merge_selected": "Merge selected mods into one .pack",
+            "merge_name": "Merged mod name",
+            "merge_done": "{} mods merged into {} ✅",
+            "merge_updated": "{} rebuilt ({} files updated)",
+            "merge_need_two": "Select at least two active mods",
+            "merge_error": "Could not merge mods: {}",
+            "merge_name_taken": "{} already exists — choose another name",
+            "rpc_failed_title": "JSON-RPC not started",
+            "rpc_failed": "Could not start the --serve server on {}: {}",
+            "broken_pack": "Damaged mod, cannot be enabled: {}",
+            "workshop_mod": "Steam Workshop mod — unsubscribe in Steam to remove it",
+            "install": "Game install",
+            "push_installs": "Apply the load order to other installs",
+            "push_source": "What to apply",
+            "current_order": "Current order",
+            "apply": "Apply",
+            "push_ok": "{}: ✅ mods enabled: {}",
+            "push_missing": "{}: ⚠ mods enabled: {}, not in this install: {}",
+            "push_failed": "{}: ❌ {}",
+            "push_shared": "{}: ⚠ skipped — shares its scripts folder with {} (only that one is written)",
+            "push_same_scripts": "Shares the current install's scripts folder: pushing would overwrite its order",
+            "update_mods": "📥 Update mods from a folder",
+            "choose_mirror": "Choose the folder with the new mod versions",
+            "update_none": "No updates: all mods match the folder",
+            "update_line": "{}: updated, read {} of {} MB; files: +{} −{} ~{}",
+            "update_failed": "{}: ❌ {}",
+            "category": "Category",
+            "cat_all": "All",
+            "cat_db": "Units and DB tables",
+            "cat_scripts": "Scripts",
+            "cat_ui": "UI",
+            "cat_maps": "Maps",
+            "cat_models": "Models and textures",
+            "cat_audio": "Audio",
+            "cat_localisation": "Localisation only",
+            "cat_other": "Other",
+            "export_modlist": "Export the mod list (with checksums)",
+            "import_modlist": "Import a mod list",
+            "modlist_file": "Mod list",
+            "modlist_saved": "Mod list saved: {} mods ✅",
+            "choose_archive": "Folder with a mod archive to restore missing mods from (optional)",
+            "import_ok": "Matching: {}",
+            "import_restored": "Restored from the archive: {}",
+            "import_mismatch": "Different version: {}",
+            "import_missing": "Not found: {}",
+            "import_error": "Could not import the mod list: {}",
+            "db_conflicts": "DB table row conflicts",
+            "db_no_conflicts": "No DB table conflicts ({} shared tables checked)",
+            "db_conflict_row": "{}: key “{}” — {} → {} wins",
+            "db_conflict_file": "{}: whole file {} — {} → {} wins (no table schema)",
+            "db_conflicts_more": "… and {} more",
             "game_not_found": "File not found: {}",
             "game_folder_not_set_short": "Game folder not set!",
             "choose_mods": "Choose mods (.pack or .zip)",
@@ -273,6 +3123,61 @@ def main(page: ft.Page):
             "move_up": "Move up",
             "move_down": "Move down",
             "backup_error": "Error creating backup: {}",
+            "watch_error": "Could not apply changes in the game folder: {}",
+            "search": "Search mods…",
+            "selected": "Selected: {}",
+            "enable_selected": "Enable selected",
+            "disable_selected": "Disable selected",
+            "move_top": "Move to top",
+            "move_bottom": "Move to bottom",
+            "position": "#",
+            "move_to_position": "Move selected to position #",
+            "delete_selected": "Delete selected",
+            "select_all": "Select all visible",
+            "clear_selection": "Clear selection",
+            "confirm_delete": "Delete selected mods ({})?",
+            "yes": "Yes",
+            "no": "No",
+            "cancel": "Cancel",
+            "undo": "Undo (Ctrl+Z)",
+            "backups": "Backups",
+            "backup_diff": "Compare with current",
+            "backup_restore": "Restore",
+            "backup_restored": "Backup restored ✅",
+            "no_backups": "No backups yet",
+            "trash": "Trash",
+            "trash_empty_list": "The trash is empty",
+            "mods_trashed": "Moved to trash: {}",
+            "trash_undo": "Undo",
+            "trash_restore": "Restore",
+            "trash_restored": "{} restored from the trash",
+            "trash_restore_error": "Could not restore {}: {}",
+            "trash_empty": "Empty trash",
+            "trash_purged": "Trash emptied: {} items, {:.1f} MB",
+            "gc": "Clean up data/",
+            "gc_nothing": "Nothing to clean up",
+            "gc_previews": "Previews without a mod: {}",
+            "gc_manifests": "Merge manifests without a mod: {}",
+            "gc_temp": "Temporary files: {}",
+            "gc_script_lines": "user.script lines without a mod: {}",
+            "gc_cache": "Cache entries without a file: {}",
+            "gc_total": "Reclaimable: {:.1f} MB",
+            "gc_clean": "Clean up",
+            "gc_done": "Clean-up finished, {:.1f} MB freed",
+            "no_changes": "No differences",
+            "close": "Close",
+            "debug": "Debug: latencies",
+            "export_json": "Export JSON",
+            "export_chrome": "Export Chrome trace",
+            "exported": "Written: {}",
+            "redo": "Redo (Ctrl+Y)",
+            "profile": "Profile",
+            "save_profile": "Save current order as profile",
+            "delete_profile": "Delete profile",
+            "profile_name": "Profile name",
+            "profile_saved": "Profile \"{}\" saved ✅",
+            "profile_applied": "Profile \"{}\" applied ✅",
+            "profile_missing": "Profile \"{}\" applied, mods not found: {}",
         }
     }
 
@@ -284,6 +3189,7 @@ def main(page: ft.Page):
     # --- UI элементы ---
     game_path = load_config()
     path_valid = bool(game_path and os.path.exists(game_path))
+    use_install(find_install(game_path))
 
     status = ft.Text(
         tr("game_folder_ok").format(game_path) if path_valid else tr("game_folder_not_set"),
@@ -291,6 +3197,7 @@ def main(page: ft.Page):
     )
 
     mods_column = ft.Column(scroll="auto", expand=True, spacing=6)
+    search_index = ModSearchIndex()
 
     image_container = ft.Container(
         content=ft.Image(src="assets/main.png", fit=ft.ImageFit.CONTAIN, width=300, height=300),
@@ -311,133 +3218,732 @@ def main(page: ft.Page):
         btn_save.text = tr("save")
         btn_refresh.text = tr("refresh")
         btn_launch.text = tr("launch")
-        left_panel.controls[0].value = tr("mod_list")
+        btn_update.text = tr("update_mods")
+        mod_list_label.value = tr("mod_list")
+        profile_dropdown.label = tr("profile")
+        btn_save_profile.tooltip = tr("save_profile")
+        btn_delete_profile.tooltip = tr("delete_profile")
+        btn_export.tooltip = tr("export_modlist")
+        btn_import.tooltip = tr("import_modlist")
         btn_choose_folder.text = tr("choose_folder")
+        btn_backups.tooltip = tr("backups")
+        btn_trash.tooltip = tr("trash")
+        btn_gc.tooltip = tr("gc")
+        btn_debug.tooltip = tr("debug")
+        btn_conflicts.tooltip = tr("db_conflicts")
+        install_dropdown.label = tr("install")
+        btn_push.tooltip = tr("push_installs")
+        search_field.hint_text = tr("search")
+        category_dropdown.label = tr("category")
+        category_dropdown.options = category_options()
+        for btn, key in bulk_buttons:
+            btn.tooltip = tr(key)
+        position_field.hint_text = tr("position")
+        update_selection_text()
         load_mod_list()
         page.update()
 
     # --- Остальные функции (load_mod_list, choose_folder, add_mod_file и т.д.) ---
     # Везде замените строки на tr("ключ") вместо текста!
 
-    def load_mod_list(e=None):
-        mods_column.controls.clear()
+    mods_dict = {}      # pack filename -> png path or None (текущий каталог data/)
+    active_order = LoadOrder()   # текущий порядок активных модов
+    row_cache = {}      # (mod_name, active, png) -> готовая строка списка
+    selected = set()    # выделенные моды для массовых операций
+    history = OrderHistory()
+    loaded_for = None   # папка игры, для которой загружен текущий порядок (история общая только в её пределах)
+    warmup = None       # прогрев кэша активных модов при запуске игры
+    ui_lock = threading.RLock()
+    watcher = None
+    merged_packs = {}   # объединённый мод -> его исходные моды (из <merged>.merge.json)
+    broken = {}         # повреждённые моды -> причина (проверка заголовка и индекса)
+    categories = {}     # мод -> категории по списку файлов внутри .pack
+    db_analyzer = DbConflictAnalyzer()   # помнит результаты по таблицам между проверками
+    merge_lock = threading.Lock()
+    trashed = {}        # мод -> его папка в корзине (для отмены удаления)
+    purge_lock = threading.Lock()
+
+    def show_preview(png_p):
+        if png_p and os.path.exists(png_p):
+            image_container.content = ft.Image(src=png_p, fit=ft.ImageFit.CONTAIN, width=300, height=300)
+        else:
+            image_container.content = None
+
+    @traced("ui.apply_order")
+    def apply_order(new_order, deleted=(), record=True):
+        """
+        Применяет изменения в памяти и сохраняет их одной записью на файл:
+        active_mods.script, user.script (для выключенных/удалённых) и одна перерисовка списка.
+        """
+        nonlocal active_order
+        with ui_lock:
+            for m in deleted:
+                entry = delete_mod_files(m, game_path)
+                if entry:
+                    trashed[m] = entry
+                mods_dict.pop(m, None)
+                search_index.remove(m)
+                selected.discard(m)
+            new_order = [m for m in new_order if m in mods_dict]
+            if record:
+                history.record(active_order, new_order)
+            if new_order != active_order:
+                write_active_mods_file(new_order)
+            kept = set(new_order)
+            remove_mods_from_user_script([m for m in active_order if m not in kept])
+            active_order = LoadOrder(new_order)
+            render_mod_list()
+        if deleted:
+            purge_trash_later()
+
+    @traced("ui.move")
+    def apply_move(m, new_index):
+        """Перемещение одного мода на любую позицию: одна запись файла и перестановка одной строки."""
+        with ui_lock:
+            if m not in active_order:
+                return
+            new_index = max(0, min(new_index, len(active_order) - 1))
+            old = active_order.move(m, new_index)
+            if old == new_index:
+                return
+            history.push(("move", old, new_index, m))
+            write_active_mods_file(active_order.to_list())
+            # активные строки всегда занимают начало списка в том же порядке
+            controls = mods_column.controls
+            controls.insert(new_index, controls.pop(old))
+        page.update()
+
+    def make_select(m):
+        def f(e):
+            with ui_lock:
+                if m in selected:
+                    selected.discard(m)
+                else:
+                    selected.add(m)
+                    show_preview(mods_dict.get(m))
+                e.control.bgcolor = SELECTED_COLOR if m in selected else None
+                update_selection_text()
+            page.update()
+        return f
+
+    def build_active_row(mod_name, png):
+        def make_on_change(m, png_p):
+            @traced("ui.toggle")
+            def on_change(e):
+                if not e.control.value:
+                    image_container.content = None
+                    apply_order(disable_mods(active_order, [m]))
+            return on_change
+
+        def make_move_up(m):
+            def f(e):
+                if m in active_order:
+                    apply_move(m, active_order.index(m) - 1)
+            return f
+
+        def make_move_down(m):
+            def f(e):
+                if m in active_order:
+                    apply_move(m, active_order.index(m) + 1)
+            return f
+
+        def make_move_to(m, where):
+            def f(e):
+                apply_move(m, 0 if where == "top" else len(active_order) - 1)
+            return f
+
+        def make_drop(m):
+            def on_accept(e):
+                src = page.get_control(e.src_id)
+                if src is not None and src.data != m and m in active_order:
+                    apply_move(src.data, active_order.index(m))
+            return on_accept
+
+        def make_delete(m):
+            @traced("ui.delete")
+            def f(e):
+                image_container.content = None
+                delete_mods([m])
+            return f
+
+        cb = ft.Checkbox(label=mod_name, value=True, on_change=make_on_change(mod_name, png))
+        if mod_name in broken:
+            cb.label = "⚠ " + mod_name
+            cb.tooltip = tr("broken_pack").format(broken[mod_name])
+        up_btn = ft.IconButton(icon=ft.Icons.ARROW_UPWARD, on_click=make_move_up(mod_name), tooltip=tr("move_up"))
+        down_btn = ft.IconButton(icon=ft.Icons.ARROW_DOWNWARD, on_click=make_move_down(mod_name), tooltip=tr("move_down"))
+        top_btn = ft.IconButton(icon=ft.Icons.VERTICAL_ALIGN_TOP, on_click=make_move_to(mod_name, "top"), tooltip=tr("move_top"))
+        bottom_btn = ft.IconButton(icon=ft.Icons.VERTICAL_ALIGN_BOTTOM, on_click=make_move_to(mod_name, "bottom"), tooltip=tr("move_bottom"))
+        del_btn = ft.IconButton(icon=ft.Icons.DELETE, on_click=make_delete(mod_name), tooltip=tr("delete_mod"))
+        if is_external_mod(mod_name):
+            del_btn.disabled = True
+            del_btn.tooltip = tr("workshop_mod")
+        actions_row = ft.Row(controls=[top_btn, up_btn, down_btn, bottom_btn, del_btn], spacing=0)
+        row = ft.Row(controls=[cb, actions_row], alignment=ft.MainAxisAlignment.SPACE_BETWEEN)
+        if TRACER.enabled:
+            TRACER.count("controls", 12)
+        # строку можно перетащить на место другого активного мода
+        draggable = ft.Draggable(group="active_mods", content=row,
+                                 content_feedback=ft.Text(mod_name), data=mod_name)
+        return ft.Container(
+            content=ft.DragTarget(group="active_mods", content=draggable, on_accept=make_drop(mod_name)),
+            on_click=make_select(mod_name),
+            border_radius=4,
+            data=mod_name
+        )
+
+    def build_inactive_row(mod_name, png):
+        def make_on_change_inactive(m, png_p):
+            @traced("ui.toggle")
+            def on_change(e):
+                if e.control.value:
+                    show_preview(png_p)
+                    apply_order(enable_mods(active_order, [m]))
+            return on_change
+
+        def make_delete_inactive(m):
+            @traced("ui.delete")
+            def f(e):
+                delete_mods([m])
+            return f
+
+        cb = ft.Checkbox(label=mod_name, value=False, on_change=make_on_change_inactive(mod_name, png))
+        if mod_name in broken:
+            cb.label = "⚠ " + mod_name
+            cb.tooltip = tr("broken_pack").format(broken[mod_name])
+            cb.disabled = True
+        del_btn = ft.IconButton(icon=ft.Icons.DELETE, on_click=make_delete_inactive(mod_name), tooltip=tr("delete_mod"))
+        if is_external_mod(mod_name):
+            del_btn.disabled = True
+            del_btn.tooltip = tr("workshop_mod")
+        if TRACER.enabled:
+            TRACER.count("controls", 4)
+        return ft.Container(
+            content=ft.Row(controls=[cb, del_btn], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
+            on_click=make_select(mod_name),
+            border_radius=4,
+            data=mod_name
+        )
+
+    # --- Массовые операции над выделенными модами ---
+    def update_selection_text():
+        selection_text.value = tr("selected").format(len(selected))
+
+    def selected_in_display_order():
+        return [row.data for row in mods_column.controls if row.data in selected]
+
+    @traced("ui.bulk")
+    def bulk_enable(e):
+        apply_order(enable_mods(active_order, [m for m in selected_in_display_order() if m not in broken]))
+
+    @traced("ui.bulk")
+    def bulk_disable(e):
+        apply_order(disable_mods(active_order, selected))
+
+    @traced("ui.bulk")
+    def bulk_move_top(e):
+        apply_order(move_mods(active_order, selected, "top"))
+
+    @traced("ui.bulk")
+    def bulk_move_bottom(e):
+        apply_order(move_mods(active_order, selected, "bottom"))
+
+    # --- Удаление через корзину ---
+    def delete_mods(names):
+        """Переносит моды в корзину; уведомление с кнопкой «Вернуть» отменяет удаление."""
+        with ui_lock:
+            was_active = [m for m in names if m in active_order]
+            apply_order(disable_mods(active_order, names), deleted=names)
+            after = active_order.to_list()
 
+        def undo_delete(ev):
+            with ui_lock:
+                # удаление было последним изменением порядка — отменяем его целиком (с позициями)
+                if was_active and active_order.to_list() == after and history.can_undo():
+                    undo_action()
+                restore_trashed(names)
+                render_mod_list()
+            page.update()
+
+        page.snack_bar = ft.SnackBar(ft.Text(tr("mods_trashed").format(len(names))),
+                                     action=tr("trash_undo"), on_action=undo_delete)
+        page.snack_bar.open = True
+        page.update()
+
+    def restore_trashed(names):
+        """Возвращает моды из корзины в data/ (порядок не меняется)."""
+        restored = []
+        with ui_lock:
+            for m in names:
+                entry = trashed.get(m)
+                if entry is None or m in mods_dict:
+                    continue
+                try:
+                    png = restore_trashed_mod(entry, game_path)
+                except OSError as ex:
+                    show_message(tr("trash_restore_error").format(m, ex))
+                    continue
+                trashed.pop(m, None)
+                mods_dict[m] = png
+                restored.append(m)
+            index_mods(restored)
+            verify_mods(restored)
+            categorize_mods(restored)
+        return restored
+
+    def purge_trash_later():
+        """Очистка корзины по лимитам config.json в фоне; одновременно идёт только одна."""
+        if not (game_path and os.path.isdir(get_trash_dir(game_path))):
+            return
+        settings = load_settings()
+        max_bytes = int(settings.get("trash_max_mb", TRASH_MAX_MB)) * 1024 * 1024
+        max_age = float(settings.get("trash_days", TRASH_MAX_DAYS)) * 86400
+        target = game_path
+
+        def worker():
+            if not purge_lock.acquire(blocking=False):
+                return
+            try:
+                purge_trash(target, max_bytes, max_age)
+                with ui_lock:
+                    for m, entry in list(trashed.items()):
+                        if not os.path.isdir(entry):
+                            del trashed[m]
+            finally:
+                purge_lock.release()
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def trash_action(e):
+        entries = list_trash(game_path) if game_path else []
+        if not entries:
+            show_message(tr("trash_empty_list"))
+            return
+
+        def make_restore(entry):
+            def f(ev):
+                dlg.open = False
+                with ui_lock:
+                    trashed.setdefault(entry["name"], entry["path"])
+                    if restore_trashed([entry["name"]]):
+                        render_mod_list()
+                        show_message(tr("trash_restored").format(entry["name"]))
+                page.update()
+            return f
+
+        def empty(ev):
+            dlg.open = False
+            page.update()
+
+            def worker():
+                with purge_lock:
+                    removed, freed = purge_trash(game_path, max_bytes=0, max_age=0)
+                with ui_lock:
+                    trashed.clear()
+                show_message(tr("trash_purged").format(removed, freed / (1024 * 1024)))
+
+            threading.Thread(target=worker, daemon=True).start()
+
+        rows = []
+        for entry in entries:
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry["time"]))
+            rows.append(ft.Row(
+                controls=[
+                    ft.Text(f"{stamp}  {entry['name']}  ({entry['size'] / (1024 * 1024):.1f} MB)", size=13),
+                    ft.IconButton(icon=ft.Icons.RESTORE_FROM_TRASH, on_click=make_restore(entry),
+                                  tooltip=tr("trash_restore")),
+                ],
+                alignment=ft.MainAxisAlignment.SPACE_BETWEEN
+            ))
+        dlg = show_dialog(tr("trash"), ft.Container(content=ft.Column(rows, scroll="auto"), width=620, height=400),
+                          [ft.TextButton(tr("trash_empty"), on_click=empty)])
+
+    # --- Очистка мусора в data/: поиск и удаление в фоне, окно только показывает итог ---
+    @traced("ui.gc")
+    def gc_action(e):
         if not (game_path and os.path.exists(game_path)):
+            show_message(tr("game_folder_not_set_short"))
+            return
+        target = game_path
+
+        def clean(ev):
+            dlg.open = False
+            page.update()
+
+            def worker():
+                freed = collect_garbage(report, target)
+                show_message(tr("gc_done").format(freed / (1024 * 1024)))
+
+            threading.Thread(target=worker, daemon=True).start()
+
+        def worker():
+            nonlocal report, dlg
+            report = find_garbage(target)
+            counts = [("gc_previews", "previews"), ("gc_manifests", "manifests"), ("gc_temp", "temp"),
+                      ("gc_script_lines", "script_lines"), ("gc_cache", "cache_entries")]
+            lines = [tr(key).format(len(report[field])) for key, field in counts if report[field]]
+            if not lines:
+                show_message(tr("gc_nothing"))
+                return
+            lines.append(tr("gc_total").format(report["bytes"] / (1024 * 1024)))
+            dlg = show_dialog(tr("gc"), ft.Column([ft.Text(ln) for ln in lines], tight=True),
+                              [ft.TextButton(tr("gc_clean"), on_click=clean)])
+
+        report = dlg = None
+        threading.Thread(target=worker, daemon=True).start()
+
+    @traced("ui.undo")
+    def undo_action(e=None):
+        with ui_lock:
+            new = history.undo(active_order.to_list())
+            if new is not None:
+                restore_trashed([m for m in new if m not in mods_dict])
+                apply_order(new, record=False)
+
+    @traced("ui.redo")
+    def redo_action(e=None):
+        with ui_lock:
+            new = history.redo(active_order.to_list())
+            if new is not None:
+                apply_order(new, record=False)
+
+    def on_keyboard(e):
+        key = (e.key or "").upper()
+        if e.ctrl and key == "Z":
+            redo_action() if e.shift else undo_action()
+        elif e.ctrl and key == "Y":
+            redo_action()
+
+    def bulk_move_to_position(e):
+        try:
+            position = int(position_field.value) - 1
+        except (TypeError, ValueError):
+            return
+        moving = [m for m in active_order if m in selected]
+        if len(moving) == 1:
+            apply_move(moving[0], position)
+        elif moving:
+            apply_order(move_mods(active_order, moving, position))
+
+    def bulk_delete(e):
+        if not selected:
+            return
+
+        def close(ev):
+            dlg.open = False
             page.update()
+
+        @traced("ui.delete")
+        def confirm(ev):
+            close(ev)
+            image_container.content = None
+            delete_mods([m for m in selected if not is_external_mod(m)])
+
+        dlg = ft.AlertDialog(
+            modal=True,
+            title=ft.Text(tr("confirm_delete").format(len(selected))),
+            actions=[ft.TextButton(tr("yes"), on_click=confirm), ft.TextButton(tr("no"), on_click=close)],
+        )
+        page.dialog = dlg
+        dlg.open = True
+        page.update()
+
+    # --- Объединение модов ---
+    def run_merge(merged, sources, register):
+        """Сборка в фоне; register=True — заменить исходные моды в порядке объединённым."""
+        def worker():
+            try:
+                with merge_lock:
+                    result = merge_packs(merged, sources, game_path)
+            except (OSError, ValueError) as ex:
+                show_message(tr("merge_error").format(ex))
+                return
+            with ui_lock:
+                merged_packs[merged] = list(sources)
+                if merged not in mods_dict:
+                    mods_dict[merged] = None
+                    index_mods([merged])
+                if register:
+                    positions = [active_order.index(m) for m in sources if m in active_order]
+                    if positions:
+                        first = min(positions)
+                        rest = [m for m in active_order if m not in sources and m != merged]
+                        apply_order(rest[:first] + [merged] + rest[first:])
+                    else:
+                        render_mod_list()   # исходные моды выключили во время сборки — объединённый остаётся выключенным
+                    selected.difference_update(sources)
+                    update_selection_text()
+            if register:
+                show_message(tr("merge_done").format(len(sources), merged))
+            elif result["mode"] != "unchanged":
+                show_message(tr("merge_updated").format(merged, result["entries"]))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def merge_selected_action(e):
+        sources = [m for m in active_order if m in selected]
+        if len(sources) < 2:
+            show_message(tr("merge_need_two"))
             return
+        name_field = ft.TextField(label=tr("merge_name"), value="merged_mods.pack", autofocus=True)
 
-        all_mods = scan_mods(game_path)
-        mods_dict = {fname: png for fname, png in all_mods}
-        active_order = read_active_mods_file()
+        def close(ev):
+            dlg.open = False
+            page.update()
 
-        changed = False
-        cleaned_active = []
-        for m in active_order:
-            if m in mods_dict:
-                cleaned_active.append(m)
-            else:
-                changed = True
-        if changed:
-            write_active_mods_file(cleaned_active)
-            active_order = cleaned_active
+        def confirm(ev):
+            name = os.path.basename((name_field.value or "").strip())
+            if not name:
+                return
+            if not name.lower().endswith(".pack"):
+                name += ".pack"
+            if name in sources:
+                return
+            path = os.path.join(game_path, "data", name)
+            if os.path.exists(path) and load_merge_manifest(path) is None:
+                show_message(tr("merge_name_taken").format(name))
+                return
+            close(ev)
+            run_merge(name, sources, register=True)
 
-        active_set = set(active_order)
+        name_field.on_submit = confirm
+        dlg = ft.AlertDialog(
+            modal=True,
+            title=ft.Text(tr("merge_selected")),
+            content=name_field,
+            actions=[ft.TextButton(tr("save"), on_click=confirm), ft.TextButton(tr("cancel"), on_click=close)],
+        )
+        page.dialog = dlg
+        dlg.open = True
+        page.update()
+
+    def select_all_visible(e):
+        with ui_lock:
+            for row in mods_column.controls:
+                if row.visible is not False:
+                    selected.add(row.data)
+                    row.bgcolor = SELECTED_COLOR
+            update_selection_text()
+        page.update()
+
+    def clear_selection(e=None):
+        with ui_lock:
+            selected.clear()
+            for row in mods_column.controls:
+                row.bgcolor = None
+            update_selection_text()
+        page.update()
+
+    @traced("ui.render")
+    def render_mod_list():
+        """Собирает список из кэша строк: новые контролы создаются только для изменившихся модов."""
+        nonlocal row_cache
+        used = {}
+        controls = []
+
+        def row_for(mod_name, active):
+            key = (mod_name, active, mods_dict.get(mod_name), broken.get(mod_name))
+            row = row_cache.get(key)
+            if row is None:
+                build = build_active_row if active else build_inactive_row
+                row = build(mod_name, mods_dict.get(mod_name))
+            row.bgcolor = SELECTED_COLOR if mod_name in selected else None
+            used[key] = row
+            return row
 
         # Активные моды
         for mod_name in active_order:
-            png = mods_dict.get(mod_name)
-
-            def make_on_change(m, png_p):
-                def on_change(e):
-                    if not e.control.value:
-                        mods = read_active_mods_file()
-                        if m in mods:
-                            mods.remove(m)
-                            write_active_mods_file(mods)
-                        remove_mod_from_user_script(m)
-                        image_container.content = None
-                        load_mod_list()
-                return on_change
-
-            def make_move_up(m):
-                def f(e):
-                    mods = read_active_mods_file()
-                    if m in mods:
-                        i = mods.index(m)
-                        if i > 0:
-                            mods[i], mods[i-1] = mods[i-1], mods[i]
-                            write_active_mods_file(mods)
-                            load_mod_list()
-                return f
-
-            def make_move_down(m):
-                def f(e):
-                    mods = read_active_mods_file()
-                    if m in mods:
-                        i = mods.index(m)
-                        if i < len(mods)-1:
-                            mods[i], mods[i+1] = mods[i+1], mods[i]
-                            write_active_mods_file(mods)
-                            load_mod_list()
-                return f
-
-            def make_delete(m):
-                def f(e):
-                    delete_mod_files(m, game_path)
-                    mods = read_active_mods_file()
-                    if m in mods:
-                        mods.remove(m)
-                        write_active_mods_file(mods)
-                    remove_mod_from_user_script(m)
-                    image_container.content = None
-                    load_mod_list()
-                return f
-
-            cb = ft.Checkbox(label=mod_name, value=True, on_change=make_on_change(mod_name, png))
-            up_btn = ft.IconButton(icon=ft.Icons.ARROW_UPWARD, on_click=make_move_up(mod_name), tooltip=tr("move_up"))
-            down_btn = ft.IconButton(icon=ft.Icons.ARROW_DOWNWARD, on_click=make_move_down(mod_name), tooltip=tr("move_down"))
-            del_btn = ft.IconButton(icon=ft.Icons.DELETE, on_click=make_delete(mod_name), tooltip=tr("delete_mod"))
-            actions_row = ft.Row(controls=[up_btn, down_btn, del_btn], spacing=2)
-            mods_column.controls.append(
-                ft.Row(
-                    controls=[cb, actions_row],
-                    alignment=ft.MainAxisAlignment.SPACE_BETWEEN
-                )
-            )
+            controls.append(row_for(mod_name, True))
 
         # Неактивные моды
+        active_set = set(active_order)
         inactive = [name for name in mods_dict.keys() if name not in active_set]
         inactive.sort(key=lambda x: x.lower())
         for mod_name in inactive:
-            png = mods_dict.get(mod_name)
-
-            def make_on_change_inactive(m, png_p):
-                def on_change(e):
-                    if e.control.value:
-                        mods = read_active_mods_file()
-                        if m not in mods:
-                            mods.append(m)
-                            write_active_mods_file(mods)
-                        if png_p and os.path.exists(png_p):
-                            image_container.content = ft.Image(src=png_p, fit=ft.ImageFit.CONTAIN, width=300, height=300)
-                        else:
-                            image_container.content = None
-                        load_mod_list()
-                return on_change
-
-            def make_delete_inactive(m):
-                def f(e):
-                    delete_mod_files(m, game_path)
-                    load_mod_list()
-                return f
-
-            cb = ft.Checkbox(label=mod_name, value=False, on_change=make_on_change_inactive(mod_name, png))
-            del_btn = ft.IconButton(icon=ft.Icons.DELETE, on_click=make_delete_inactive(mod_name), tooltip=tr("delete_mod"))
-            mods_column.controls.append(ft.Row(controls=[cb, del_btn],
-                                               alignment=ft.MainAxisAlignment.SPACE_BETWEEN))
+            controls.append(row_for(mod_name, False))
+
+        row_cache = used
+        selected.intersection_update(mods_dict)
+        update_selection_text()
+        mods_column.controls = controls
+        filter_rows()
+        page.update()
 
+    def filter_rows():
+        query = search_field.value or ""
+        matches = search_index.search(query) if query.strip() else None
+        category = category_dropdown.value or ""
+        for row in mods_column.controls:
+            row.visible = ((matches is None or row.data in matches)
+                           and (not category or category in categories.get(row.data, ())))
+
+    def apply_filter(e=None):
+        with ui_lock:
+            filter_rows()
         page.update()
 
+    def index_mods(names):
+        """Добавляет моды в поисковый индекс; названия из .loc подгружаются в фоне."""
+        for name in names:
+            search_index.add(name)
+        if not names:
+            return
+        def worker():
+            for name in names:
+                try:
+                    title = cached_pack_info(mod_path(game_path, name), "title", read_pack_display_name)
+                except OSError:
+                    continue
+                if title:
+                    with ui_lock:
+                        if name in search_index:
+                            search_index.add(name, title)
+            save_pack_cache()
+            if (search_field.value or "").strip():
+                apply_filter()
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def categorize_mods(names):
+        """Категории модов в фоне; фильтр по категории дальше работает только по памяти."""
+        if not names:
+            return
+        paths = {mod_path(game_path, n): n for n in names}
+
+        def worker():
+            found = classify_packs(list(paths))
+            save_pack_cache()
+            with ui_lock:
+                for path, cats in found.items():
+                    categories[paths[path]] = cats
+            if category_dropdown.value:
+                apply_filter()
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def verify_mods(names):
+        """Проверка целостности в фоне; повреждённые моды помечаются в списке."""
+        if not names:
+            return
+        paths = {mod_path(game_path, n): n for n in names}
+
+        def worker():
+            found = verify_packs(list(paths))
+            save_pack_cache()
+            with ui_lock:
+                before = {n: broken.get(n) for n in names}
+                for n in names:
+                    broken.pop(n, None)
+                broken.update({paths[p]: reason for p, reason in found.items()})
+                if any(broken.get(n) != before[n] for n in names):
+                    render_mod_list()
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    @traced("ui.load_mod_list")
+    def load_mod_list(e=None):
+        nonlocal mods_dict, active_order, loaded_for
+        with ui_lock:
+            previous = active_order.to_list()
+            row_cache.clear()
+            mods_dict = {}
+            active_order = LoadOrder()
+
+            if not (game_path and os.path.exists(game_path)):
+                mods_column.controls.clear()
+                page.update()
+                return
+
+            all_mods = scan_mods(game_path)
+            mods_dict = {fname: png for fname, png in all_mods}
+            merged_packs.clear()
+            merged_packs.update(find_merged_packs(game_path))
+            active_order = LoadOrder(read_active_mods_file())
+
+            for name in [m for m in search_index if m not in mods_dict]:
+                search_index.remove(name)
+            index_mods([m for m in mods_dict if m not in search_index])
+            broken.clear()
+            verify_mods(list(mods_dict))
+            categories.clear()
+            categorize_mods(list(mods_dict))
+
+            changed = False
+            cleaned_active = []
+            for m in active_order:
+                if m in mods_dict:
+                    cleaned_active.append(m)
+                else:
+                    changed = True
+            if changed:
+                write_active_mods_file(cleaned_active)
+                active_order = LoadOrder(cleaned_active)
+
+            if loaded_for == game_path:
+                history.record(previous, active_order)
+            else:
+                history.clear()
+                loaded_for = game_path
+
+            render_mod_list()
+        purge_trash_later()
+
+    @traced("ui.fs_change")
+    def on_fs_change(changes):
+        """Вызывается из потока watcher'а: применяет только изменившиеся записи."""
+        nonlocal active_order
+        with ui_lock:
+            if not (game_path and os.path.exists(game_path)):
+                return
+            data_dir = os.path.abspath(os.path.join(game_path, "data"))
+            scripts_dir = get_scripts_dir()
+            user_script = get_user_script_path()
+            active_mods = get_active_mods_path()
+            script_names = changes.get(scripts_dir, set())
+
+            order = list(active_order)
+            data_names = changes.get(data_dir, set())
+            if data_names:
+                present, missing = scan_mod_entries(game_path, data_names)
+                mods_dict.update(present)
+                for m in missing:
+                    mods_dict.pop(m, None)
+                    search_index.remove(m)
+                index_mods([m for m in present if m in data_names])
+                verify_mods([m for m in present if m in data_names])
+                categorize_mods([m for m in present if m in data_names])
+                for m in missing:
+                    broken.pop(m, None)
+                    categories.pop(m, None)
+                if missing:
+                    order = [m for m in order if m not in missing]
+                # изменился исходный мод объединённого пака — пересобираем только его часть
+                for merged, sources in merged_packs.items():
+                    if merged in mods_dict and any(m in present for m in sources if m in data_names):
+                        run_merge(merged, sources, register=False)
+
+            # user.script переписан официальным лаунчером — берём порядок оттуда
+            if os.path.basename(user_script) in script_names and not is_own_write(user_script):
+                order = [m for m in user_script_mod_order() if m in mods_dict]
+            elif os.path.basename(active_mods) in script_names and not is_own_write(active_mods):
+                order = [m for m in read_active_mods_file() if m in mods_dict]
+
+            if order != read_active_mods_file():
+                write_active_mods_file(order)
+            history.record(active_order, order)
+            active_order = LoadOrder(order)
+            render_mod_list()
+
+    def restart_watcher():
+        nonlocal watcher
+        if watcher is not None:
+            watcher.stop()
+            watcher = None
+        if game_path and os.path.exists(game_path):
+            watcher = start_watcher([os.path.join(game_path, "data"), get_scripts_dir()], on_fs_change,
+                                    on_error=lambda ex: show_message(tr("watch_error").format(ex)))
+
+    @traced("ui.choose_folder")
     def choose_folder(e):
         nonlocal game_path, path_valid
         new_path = select_game_folder()
@@ -445,14 +3951,16 @@ def main(page: ft.Page):
             return
         game_path = new_path
         save_config(game_path)
+        use_install(register_install(game_path))
+        refresh_installs()
+        refresh_profiles()
         path_valid = bool(game_path and os.path.exists(game_path))
+        restart_watcher()
         status.value = tr("game_folder_ok").format(game_path) if path_valid else tr("game_folder_not_set")
 
-        user_script_path = get_user_script_path()
-        backup_path = os.path.join(os.path.dirname(user_script_path), "user_backup.script")
-        if os.path.exists(user_script_path):
+        if os.path.exists(get_user_script_path()):
             try:
-                shutil.copy(user_script_path, backup_path)
+                snapshot_scripts("choose_folder")
             except Exception as ex:
                 page.snack_bar = ft.SnackBar(ft.Text(tr("backup_error").format(ex)))
                 page.snack_bar.open = True
@@ -460,6 +3968,7 @@ def main(page: ft.Page):
 
         load_mod_list()
 
+    @traced("ui.add")
     def add_mod_file(e):
         if not (game_path and os.path.exists(game_path)):
             page.snack_bar = ft.SnackBar(ft.Text(tr("game_folder_not_set_short")))
@@ -486,6 +3995,482 @@ def main(page: ft.Page):
         page.snack_bar.open = True
         page.update()
 
+    # --- Обновление модов из папки с новыми версиями ---
+    def update_report_lines(reports):
+        lines = []
+        for r in reports:
+            if r["status"] == "updated":
+                lines.append(tr("update_line").format(
+                    r["name"], round(r["bytes_transferred"] / 2 ** 20, 1), round(r["bytes_total"] / 2 ** 20, 1),
+                    len(r["added"]), len(r["removed"]), len(r["modified"])))
+                for key, mark in (("added", "+"), ("removed", "−"), ("modified", "~")):
+                    lines.extend(f"    {mark} {name}" for name in r[key][:20])
+            elif r["status"] == "error":
+                lines.append(tr("update_failed").format(r["name"], r["error"]))
+        return lines
+
+    @traced("ui.update")
+    def update_mods_action(e):
+        if not (game_path and os.path.exists(game_path)):
+            show_message(tr("game_folder_not_set_short"))
+            return
+        settings = load_settings()
+        mirror = select_folder(tr("choose_mirror"), settings.get("mirror_dir"))
+        if not mirror:
+            return
+        settings["mirror_dir"] = mirror
+        save_settings(settings)
+
+        def worker():
+            lines = update_report_lines(update_mods_from_mirror(game_path, mirror))
+            if not lines:
+                show_message(tr("update_none"))
+                return
+            show_dialog(tr("update_mods"), ft.Column([ft.Text("\n".join(lines), selectable=True, size=12)],
+                                                     scroll=ft.ScrollMode.AUTO, height=400, width=700))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    # --- Профили ---
+    def show_message(text):
+        page.snack_bar = ft.SnackBar(ft.Text(text))
+        page.snack_bar.open = True
+        page.update()
+
+    def refresh_profiles(current=None):
+        profile_dropdown.options = [ft.dropdown.Option(n) for n in list_profiles()]
+        profile_dropdown.value = current
+
+    @traced("ui.profile")
+    def switch_profile(e):
+        nonlocal active_order
+        name = profile_dropdown.value
+        if not name or not (game_path and os.path.exists(game_path)):
+            return
+        with ui_lock:
+            order, missing = apply_profile(name, mods_dict)
+            history.record(active_order, order)
+            active_order = LoadOrder(order)
+            render_mod_list()
+        if missing:
+            show_message(tr("profile_missing").format(name, len(missing)))
+        else:
+            show_message(tr("profile_applied").format(name))
+
+    def save_profile_action(e):
+        name_field = ft.TextField(label=tr("profile_name"), value=profile_dropdown.value or "", autofocus=True)
+
+        def close(ev):
+            dlg.open = False
+            page.update()
+
+        def confirm(ev):
+            name = (name_field.value or "").strip()
+            if not name:
+                return
+            close(ev)
+            save_profile(name, active_order)
+            refresh_profiles(name)
+            show_message(tr("profile_saved").format(name))
+
+        name_field.on_submit = confirm
+        dlg = ft.AlertDialog(
+            modal=True,
+            title=ft.Text(tr("save_profile")),
+            content=name_field,
+            actions=[ft.TextButton(tr("save"), on_click=confirm), ft.TextButton(tr("cancel"), on_click=close)],
+        )
+        page.dialog = dlg
+        dlg.open = True
+        page.update()
+
+    # --- Экспорт / импорт списка модов ---
+    @traced("ui.export")
+    def export_action(e):
+        if not (game_path and os.path.exists(game_path)):
+            show_message(tr("game_folder_not_set_short"))
+            return
+        dest = select_file(tr("export_modlist"), [(tr("modlist_file"), "*" + MODLIST_SUFFIX)],
+                           save_as=(profile_dropdown.value or "mods") + MODLIST_SUFFIX)
+        if not dest:
+            return
+        order = active_order.to_list()
+
+        def worker():
+            try:
+                show_message(tr("modlist_saved").format(export_modlist(order, game_path, dest)))
+            except OSError as ex:
+                show_message(tr("import_error").format(ex))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def apply_imported(results):
+        """Подхватывает восстановленные файлы и применяет порядок из списка одной записью."""
+        restored = [r["name"] for r in results if r["status"] == "restored"]
+        with ui_lock:
+            if restored:
+                present, _missing = scan_mod_entries(game_path, restored)
+                mods_dict.update(present)
+                index_mods(list(present))
+                verify_mods(list(present))
+                categorize_mods(list(present))
+            apply_order([r["name"] for r in results if r["status"] != "missing"])
+
+    def import_report_lines(results):
+        lines = []
+        for status, key in (("ok", "import_ok"), ("restored", "import_restored"),
+                            ("mismatch", "import_mismatch"), ("missing", "import_missing")):
+            names = [r["name"] for r in results if r["status"] == status]
+            if names:
+                lines.append(tr(key).format(len(names)))
+                if status != "ok":
+                    lines.extend("    " + n for n in names)
+        return lines
+
+    @traced("ui.import")
+    def import_action(e):
+        if not (game_path and os.path.exists(game_path)):
+            show_message(tr("game_folder_not_set_short"))
+            return
+        path = select_file(tr("import_modlist"), [(tr("modlist_file"), "*" + MODLIST_SUFFIX), ("JSON", "*.json")])
+        if not path:
+            return
+
+        def worker():
+            try:
+                results = check_modlist(read_modlist(path), game_path)
+                if any(r["status"] == "missing" for r in results):
+                    archive = select_folder(tr("choose_archive"), load_settings().get("mirror_dir"))
+                    if archive:
+                        results = import_modlist(path, game_path, archive)
+            except (OSError, ValueError) as ex:
+                show_message(tr("import_error").format(ex))
+                return
+            apply_imported(results)
+            show_dialog(tr("import_modlist"), ft.Column([ft.Text("\n".join(import_report_lines(results)),
+                                                                 selectable=True, size=12)],
+                                                        scroll=ft.ScrollMode.AUTO, height=400, width=600))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def delete_profile_action(e):
+        if profile_dropdown.value:
+            delete_profile(profile_dropdown.value)
+            refresh_profiles()
+            page.update()
+
+    # --- Несколько установок игры ---
+    def refresh_installs():
+        installs = list_installs()
+        install_dropdown.options = [ft.dropdown.Option(i["game_path"], i.get("name") or i["game_path"]) for i in installs]
+        current = find_install(game_path)
+        install_dropdown.value = current["game_path"] if current else None
+
+    def switch_install(e):
+        nonlocal game_path, path_valid
+        install = find_install(install_dropdown.value)
+        if install is None or (game_path and _same_path(install["game_path"], game_path)):
+            return
+        game_path = install["game_path"]
+        save_config(game_path)
+        use_install(install)
+        path_valid = bool(game_path and os.path.exists(game_path))
+        status.value = tr("game_folder_ok").format(game_path) if path_valid else tr("game_folder_not_set")
+        refresh_profiles()
+        restart_watcher()
+        load_mod_list()
+        page.update()
+
+    def push_action(e):
+        installs = list_installs()
+        if not installs:
+            return
+        # другие установки с той же папкой скриптов перезаписали бы файлы текущей
+        own_scripts = os.path.normcase(get_scripts_dir())
+        checks = []
+        for i in installs:
+            current = bool(game_path and _same_path(i["game_path"], game_path))
+            shares = not current and install_scripts_dir(i) == own_scripts
+            checks.append(ft.Checkbox(label=i.get("name") or i["game_path"], data=i, value=not (current or shares),
+                                      disabled=shares, tooltip=tr("push_same_scripts") if shares else None))
+        source = ft.Dropdown(label=tr("push_source"), value="", dense=True,
+                             options=[ft.dropdown.Option("", tr("current_order"))]
+                             + [ft.dropdown.Option(n) for n in list_profiles()])
+
+        def report_line(r):
+            if r["error"]:
+                return tr("push_failed").format(r["name"], r["error"])
+            if r["shared_with"]:
+                return tr("push_shared").format(r["name"], r["shared_with"])
+            if r["missing"]:
+                return tr("push_missing").format(r["name"], r["enabled"], ", ".join(r["missing"]))
+            return tr("push_ok").format(r["name"], r["enabled"])
+
+        @traced("ui.push")
+        def apply(ev):
+            targets = [c.data for c in checks if c.value]
+            if not targets:
+                return
+            dlg.open = False
+            page.update()
+            order = load_profile(source.value)["order"] if source.value else active_order.to_list()
+
+            def worker():
+                reports = push_order_to_installs(order, targets)
+                if any(_same_path(r["game_path"], game_path) for r in reports if game_path):
+                    load_mod_list()   # свои записи watcher пропускает — перечитываем сами
+                show_dialog(tr("push_installs"),
+                            ft.Column([ft.Text(report_line(r), selectable=True) for r in reports], tight=True))
+
+            threading.Thread(target=worker, daemon=True).start()
+
+        dlg = show_dialog(tr("push_installs"), ft.Column([source] + checks, tight=True, scroll=ft.ScrollMode.AUTO),
+                          [ft.TextButton(tr("apply"), on_click=apply)])
+
+    # --- Резервные копии ---
+    def show_dialog(title, content, actions=None):
+        def close(ev):
+            dlg.open = False
+            page.update()
+
+        dlg = ft.AlertDialog(
+            title=ft.Text(title),
+            content=content,
+            actions=(actions or []) + [ft.TextButton(tr("close"), on_click=close)],
+        )
+        page.dialog = dlg
+        dlg.open = True
+        page.update()
+        return dlg
+
+    def backups_action(e):
+        snapshots = list_backups()
+        if not snapshots:
+            show_message(tr("no_backups"))
+            return
+
+        def make_diff(snap):
+            def f(ev):
+                lines = diff_backup(snap)
+                text = ft.Text("\n".join(lines) if lines else tr("no_changes"), font_family="monospace",
+                               size=12, selectable=True)
+                show_dialog(tr("backup_diff"), ft.Container(content=ft.Column([text], scroll="auto"),
+                                                            width=700, height=420))
+            return f
+
+        def make_restore(snap):
+            def f(ev):
+                dlg.open = False
+                restore_backup(snap)
+                load_mod_list()
+                show_message(tr("backup_restored"))
+            return f
+
+        rows = []
+        for snap in snapshots:
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(snap["time"]))
+            rows.append(ft.Row(
+                controls=[
+                    ft.Text(f"{stamp}  {snap.get('reason', '')}", size=13),
+                    ft.Row(controls=[
+                        ft.IconButton(icon=ft.Icons.DIFFERENCE, on_click=make_diff(snap), tooltip=tr("backup_diff")),
+                        ft.IconButton(icon=ft.Icons.RESTORE, on_click=make_restore(snap), tooltip=tr("backup_restore")),
+                    ], spacing=0),
+                ],
+                alignment=ft.MainAxisAlignment.SPACE_BETWEEN
+            ))
+        dlg = show_dialog(tr("backups"), ft.Container(content=ft.Column(rows, scroll="auto"), width=520, height=400))
+
+    # --- JSON-RPC (--serve): те же операции, что и в окне, под общей блокировкой ---
+    def rpc_mod_names(params, key="mods"):
+        mods = params.get(key)
+        if not isinstance(mods, list) or not all(isinstance(m, str) for m in mods):
+            raise RpcError(RPC_INVALID_PARAMS, f'"{key}" must be a list of mod file names')
+        unknown = [m for m in mods if m not in mods_dict]
+        if unknown:
+            raise RpcError(RPC_INVALID_PARAMS, "unknown mods: " + ", ".join(unknown))
+        return mods
+
+    def rpc_list(params):
+        with ui_lock:
+            active = active_order.to_list()
+            active_set = set(active)
+            return {
+                "game_path": game_path,
+                "active": active,
+                "inactive": sorted((m for m in mods_dict if m not in active_set), key=str.lower),
+                "broken": dict(broken),
+                "categories": {m: categories.get(m, []) for m in mods_dict},
+            }
+
+    def rpc_enable(params):
+        with ui_lock:
+            mods = rpc_mod_names(params)
+            damaged = [m for m in mods if m in broken]
+            if damaged:
+                raise RpcError(RPC_INVALID_PARAMS, "damaged mods: " + ", ".join(damaged))
+            apply_order(enable_mods(active_order, mods))
+            return active_order.to_list()
+
+    def rpc_disable(params):
+        with ui_lock:
+            apply_order(disable_mods(active_order, rpc_mod_names(params)))
+            return active_order.to_list()
+
+    def rpc_reorder(params):
+        """{"order": [...]} задаёт весь порядок, {"mods": [...], "position": "top"|"bottom"|N} двигает часть."""
+        with ui_lock:
+            if "order" in params:
+                apply_order(rpc_mod_names(params, "order"))
+            else:
+                mods = rpc_mod_names(params)
+                position = params.get("position", "top")
+                if position not in ("top", "bottom") and not isinstance(position, int):
+                    raise RpcError(RPC_INVALID_PARAMS, '"position" must be "top", "bottom" or an index')
+                apply_order(move_mods(active_order, mods, position))
+            return active_order.to_list()
+
+    def rpc_save(params):
+        with ui_lock:
+            sync_active_into_user_script(active_order.to_list())
+        return True
+
+    def rpc_scan(params):
+        load_mod_list()
+        return len(mods_dict)
+
+    def rpc_install(params):
+        paths = params.get("paths")
+        if not isinstance(paths, list) or not all(isinstance(p, str) and os.path.isfile(p) for p in paths):
+            raise RpcError(RPC_INVALID_PARAMS, '"paths" must be a list of existing .pack/.zip files')
+        if not (game_path and os.path.exists(game_path)):
+            raise RpcError(RPC_INVALID_PARAMS, "game folder is not set")
+        for path in paths:
+            if path.lower().endswith(".pack"):
+                add_pack_file(path, game_path)
+            elif path.lower().endswith(".zip"):
+                add_zip_archive(path, game_path)
+        load_mod_list()
+        return len(mods_dict)
+
+    def rpc_update(params):
+        mirror = params.get("mirror")
+        if not (isinstance(mirror, str) and os.path.isdir(mirror)):
+            raise RpcError(RPC_INVALID_PARAMS, '"mirror" must be an existing folder')
+        if not (game_path and os.path.exists(game_path)):
+            raise RpcError(RPC_INVALID_PARAMS, "game folder is not set")
+        return update_mods_from_mirror(game_path, mirror)
+
+    def rpc_export(params):
+        dest = params.get("path")
+        if not isinstance(dest, str) or not dest:
+            raise RpcError(RPC_INVALID_PARAMS, '"path" must be a file name')
+        with ui_lock:
+            order = active_order.to_list()
+        return export_modlist(order, game_path, os.path.abspath(dest))
+
+    def rpc_import(params):
+        path, archive = params.get("path"), params.get("archive")
+        path = os.path.abspath(path) if isinstance(path, str) and path else None
+        archive = os.path.abspath(archive) if isinstance(archive, str) and archive else archive
+        if not (path and os.path.isfile(path)):
+            raise RpcError(RPC_INVALID_PARAMS, '"path" must be an existing mod list file')
+        if archive is not None and not (isinstance(archive, str) and os.path.exists(archive)):
+            raise RpcError(RPC_INVALID_PARAMS, '"archive" must be an existing folder or .zip')
+        try:
+            results = import_modlist(path, game_path, archive)
+        except ValueError as ex:
+            raise RpcError(RPC_INVALID_PARAMS, str(ex))
+        apply_imported(results)
+        return results
+
+    def rpc_conflicts(params):
+        return analyze_db_conflicts()
+
+    def rpc_gc(params):
+        """Без параметров — только отчёт; {"clean": true} ещё и удаляет найденное."""
+        if not (game_path and os.path.exists(game_path)):
+            raise RpcError(RPC_INVALID_PARAMS, "game folder is not set")
+        report = find_garbage(game_path)
+        result = {k: len(v) if isinstance(v, list) else v for k, v in report.items()}
+        if params.get("clean"):
+            result["freed"] = collect_garbage(report, game_path)
+        return result
+
+    def start_rpc_server():
+        global RPC_ADDRESS
+        methods = {
+            "list": (rpc_list, False),
+            "enable": (rpc_enable, True),
+            "disable": (rpc_disable, True),
+            "reorder": (rpc_reorder, True),
+            "save": (rpc_save, True),
+            "scan": (rpc_scan, True),
+            "install": (rpc_install, True),
+            "update": (rpc_update, True),
+            "export": (rpc_export, False),
+            "conflicts": (rpc_conflicts, False),
+            "gc": (rpc_gc, True),
+            "import": (rpc_import, True),
+        }
+        address, RPC_ADDRESS = RPC_ADDRESS, None   # один сервер на процесс, даже если Flet вызовет main() ещё раз
+        try:
+            RpcServer(address, methods).start()
+        except (OSError, ValueError) as ex:
+            show_dialog(tr("rpc_failed_title"), ft.Text(tr("rpc_failed").format(address, ex), selectable=True))
+
+    # --- Конфликты строк в таблицах БД ---
+    DB_CONFLICTS_SHOWN = 500
+
+    def analyze_db_conflicts():
+        with ui_lock:
+            paths = [mod_path(game_path, m) for m in active_order]
+        return db_analyzer.analyze(paths)
+
+    @traced("ui.db_conflicts")
+    def db_conflicts_action(e):
+        if not (game_path and os.path.exists(game_path)):
+            show_message(tr("game_folder_not_set_short"))
+            return
+
+        def worker():
+            report = analyze_db_conflicts()
+            conflicts = report["conflicts"]
+            if not conflicts:
+                show_message(tr("db_no_conflicts").format(report["tables"]))
+                return
+            lines = [tr("db_conflict_row" if c["kind"] == "row" else "db_conflict_file").format(
+                         c["table"], c["key"], ", ".join(c["mods"]), c["winner"])
+                     for c in conflicts[:DB_CONFLICTS_SHOWN]]
+            if len(conflicts) > DB_CONFLICTS_SHOWN:
+                lines.append(tr("db_conflicts_more").format(len(conflicts) - DB_CONFLICTS_SHOWN))
+            text = ft.Text("\n".join(lines), font_family="monospace", size=11, selectable=True)
+            show_dialog(tr("db_conflicts"), ft.Container(content=ft.Column([text], scroll="auto"),
+                                                         width=780, height=420))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    # --- Отладочная панель (только с --trace) ---
+    def debug_action(e):
+        lines = []
+        for name, h in TRACER.summary().items():
+            lines.append(f"{name:34} n={h['count']:<6} p50={h['p50_ms']:.2f}ms p99={h['p99_ms']:.2f}ms "
+                         f"max={h['max_ms']:.2f}ms r={h['bytes_read']} w={h['bytes_written']} "
+                         f"stat={h['stats']} ui={h['controls']}")
+
+        def make_export(fmt):
+            def f(ev):
+                path = os.path.splitext(TRACER.output[0])[0] + (".chrome.json" if fmt == "chrome" else ".json")
+                TRACER.dump(path, fmt)
+                show_message(tr("exported").format(os.path.abspath(path)))
+            return f
+
+        text = ft.Text("\n".join(lines), font_family="monospace", size=11, selectable=True)
+        show_dialog(tr("debug"), ft.Container(content=ft.Column([text], scroll="auto"), width=780, height=420),
+                    [ft.TextButton(tr("export_json"), on_click=make_export("json")),
+                     ft.TextButton(tr("export_chrome"), on_click=make_export("chrome"))])
+
+    @traced("ui.save")
     def save_button_action(e):
         active = read_active_mods_file()
         sync_active_into_user_script(active)
@@ -494,13 +4479,16 @@ def main(page: ft.Page):
         page.update()
         load_mod_list()
 
+    @traced("ui.refresh")
     def refresh_button_action(e):
         load_mod_list()
         page.snack_bar = ft.SnackBar(ft.Text(tr("refreshed")))
         page.snack_bar.open = True
         page.update()
 
+    @traced("ui.launch")
     def launch_game(e):
+        nonlocal warmup
         if not (game_path and os.path.exists(game_path)):
             page.snack_bar = ft.SnackBar(ft.Text(tr("game_folder_not_set_short")))
             page.snack_bar.open = True
@@ -512,9 +4500,19 @@ def main(page: ft.Page):
             page.snack_bar.open = True
             page.update()
             return
+        # прогрев кэша: активные моды в порядке загрузки, до и во время старта игры
+        if warmup is not None:
+            warmup.cancel()
+        budget_mb = int(load_settings().get("warmup_budget_mb", WARMUP_BUDGET_MB))
+        if budget_mb > 0 and len(active_order):
+            warmup = PackWarmup([mod_path(game_path, m) for m in active_order], budget_mb * 1024 * 1024).start()
         try:
             subprocess.Popen(f'start "" "{exe_path}"', shell=True, cwd=game_path)
-            page.snack_bar = ft.SnackBar(ft.Text(tr("game_launched")))
+            if warmup is not None:
+                page.snack_bar = ft.SnackBar(ft.Text(tr("warmup_started").format(budget_mb)),
+                                             action=tr("warmup_stop"), on_action=lambda ev: warmup.cancel())
+            else:
+                page.snack_bar = ft.SnackBar(ft.Text(tr("game_launched")))
             page.snack_bar.open = True
             page.update()
         except Exception as ex:
@@ -527,10 +4525,50 @@ def main(page: ft.Page):
     btn_save = ft.ElevatedButton(tr("save"), on_click=save_button_action, width=300, height=48)
     btn_refresh = ft.ElevatedButton(tr("refresh"), on_click=refresh_button_action, width=300, height=48)
     btn_launch = ft.ElevatedButton(tr("launch"), on_click=launch_game, width=300, height=48)
+    btn_update = ft.ElevatedButton(tr("update_mods"), on_click=update_mods_action, width=300, height=48)
     btn_choose_folder = ft.ElevatedButton(tr("choose_folder"), on_click=choose_folder)
+    install_dropdown = ft.Dropdown(label=tr("install"), on_change=switch_install, dense=True, width=200)
+    btn_push = ft.IconButton(icon=ft.Icons.PUBLISH, on_click=push_action, tooltip=tr("push_installs"))
+    refresh_installs()
+    btn_backups = ft.IconButton(icon=ft.Icons.HISTORY, on_click=backups_action, tooltip=tr("backups"))
+    btn_trash = ft.IconButton(icon=ft.Icons.DELETE_OUTLINE, on_click=trash_action, tooltip=tr("trash"))
+    btn_gc = ft.IconButton(icon=ft.Icons.CLEANING_SERVICES, on_click=gc_action, tooltip=tr("gc"))
+    btn_conflicts = ft.IconButton(icon=ft.Icons.TABLE_CHART, on_click=db_conflicts_action, tooltip=tr("db_conflicts"))
+    btn_debug = ft.IconButton(icon=ft.Icons.BUG_REPORT, on_click=debug_action, tooltip=tr("debug"),
+                              visible=TRACER.enabled)
+    search_field = ft.TextField(hint_text=tr("search"), prefix_icon=ft.Icons.SEARCH, on_change=apply_filter,
+                                dense=True, width=400)
+
+    def category_options():
+        return [ft.dropdown.Option("", tr("cat_all"))] + [ft.dropdown.Option(c, tr("cat_" + c)) for c in MOD_CATEGORIES]
+
+    category_dropdown = ft.Dropdown(label=tr("category"), options=category_options(), value="",
+                                    on_change=apply_filter, dense=True, width=190)
+    search_row = ft.Row(controls=[search_field, category_dropdown], spacing=10, width=600)
+
+    selection_text = ft.Text(tr("selected").format(0), size=13)
+    bulk_buttons = [
+        (ft.IconButton(icon=ft.Icons.CHECK_BOX, on_click=bulk_enable), "enable_selected"),
+        (ft.IconButton(icon=ft.Icons.CHECK_BOX_OUTLINE_BLANK, on_click=bulk_disable), "disable_selected"),
+        (ft.IconButton(icon=ft.Icons.VERTICAL_ALIGN_TOP, on_click=bulk_move_top), "move_top"),
+        (ft.IconButton(icon=ft.Icons.VERTICAL_ALIGN_BOTTOM, on_click=bulk_move_bottom), "move_bottom"),
+        (ft.IconButton(icon=ft.Icons.LOW_PRIORITY, on_click=bulk_move_to_position), "move_to_position"),
+        (ft.IconButton(icon=ft.Icons.DELETE_SWEEP, on_click=bulk_delete), "delete_selected"),
+        (ft.IconButton(icon=ft.Icons.MERGE_TYPE, on_click=merge_selected_action), "merge_selected"),
+        (ft.IconButton(icon=ft.Icons.SELECT_ALL, on_click=select_all_visible), "select_all"),
+        (ft.IconButton(icon=ft.Icons.DESELECT, on_click=clear_selection), "clear_selection"),
+        (ft.IconButton(icon=ft.Icons.UNDO, on_click=undo_action), "undo"),
+        (ft.IconButton(icon=ft.Icons.REDO, on_click=redo_action), "redo"),
+    ]
+    for btn, key in bulk_buttons:
+        btn.tooltip = tr(key)
+    position_field = ft.TextField(hint_text=tr("position"), width=56, dense=True,
+                                  keyboard_type=ft.KeyboardType.NUMBER, on_submit=bulk_move_to_position)
+    bulk_row = ft.Row(controls=[selection_text] + [btn for btn, _ in bulk_buttons[:4]] + [position_field]
+                      + [btn for btn, _ in bulk_buttons[4:]], spacing=2)
 
     buttons_column = ft.Column(
-        controls=[btn_add_mod, btn_save, btn_refresh, btn_launch],
+        controls=[btn_add_mod, btn_save, btn_refresh, btn_update, btn_launch],
         spacing=12,
         horizontal_alignment=ft.CrossAxisAlignment.CENTER
     )
@@ -547,11 +4585,26 @@ def main(page: ft.Page):
         border=ft.border.all(1, "white"),
         padding=10,
         width=600,
-        height=page.window_height - 70
+        height=page.window_height - 190
+    )
+
+    mod_list_label = ft.Text(tr("mod_list"), size=16, weight="bold")
+    profile_dropdown = ft.Dropdown(label=tr("profile"), on_change=switch_profile, dense=True, width=220)
+    btn_save_profile = ft.IconButton(icon=ft.Icons.SAVE_AS, on_click=save_profile_action, tooltip=tr("save_profile"))
+    btn_delete_profile = ft.IconButton(icon=ft.Icons.DELETE_OUTLINE, on_click=delete_profile_action,
+                                       tooltip=tr("delete_profile"))
+    btn_export = ft.IconButton(icon=ft.Icons.IOS_SHARE, on_click=export_action, tooltip=tr("export_modlist"))
+    btn_import = ft.IconButton(icon=ft.Icons.FILE_OPEN, on_click=import_action, tooltip=tr("import_modlist"))
+    refresh_profiles()
+    header_row = ft.Row(
+        controls=[mod_list_label, ft.Row(controls=[profile_dropdown, btn_save_profile, btn_delete_profile,
+                                                   btn_export, btn_import], spacing=2)],
+        alignment=ft.MainAxisAlignment.SPACE_BETWEEN,
+        width=600
     )
 
     left_panel = ft.Column(
-        controls=[ft.Text(tr("mod_list"), size=16, weight="bold"), mods_container],
+        controls=[header_row, search_row, bulk_row, mods_container],
         expand=True
     )
 
@@ -571,16 +4624,34 @@ def main(page: ft.Page):
     )
 
     bottom_row = ft.Row(
-        controls=[status, lang_row, btn_choose_folder],
+        controls=[status, lang_row, ft.Row(controls=[btn_debug, btn_conflicts, btn_backups, btn_trash, btn_gc, install_dropdown, btn_push, btn_choose_folder], spacing=4)],
         alignment=ft.MainAxisAlignment.SPACE_BETWEEN
     )
 
     main_row = ft.Row(controls=[left_panel, right_panel], expand=True, spacing=20)
     layout = ft.Column(controls=[main_row, ft.Divider(), bottom_row], expand=True)
     page.add(layout)
+    page.on_keyboard_event = on_keyboard
 
     if path_valid:
         _ = read_active_mods_file()
         load_mod_list()
+        restart_watcher()
+    if RPC_ADDRESS:
+        start_rpc_server()
 
-ft.app(target=main)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Total War: Warhammer II — Mod Manager")
+    parser.add_argument("--trace", metavar="PATH", nargs="?", const="trace.json", default=os.environ.get("WH2MM_TRACE"),
+                        help="record handler/I-O latencies and write them to PATH on exit")
+    parser.add_argument("--trace-format", choices=("json", "chrome"), default="json",
+                        help="json: latency histograms; chrome: chrome://tracing events")
+    parser.add_argument("--serve", metavar="ADDRESS", nargs="?", const=RPC_DEFAULT_ADDRESS,
+                        help="serve JSON-RPC on host:port or unix:/path (default %(const)s)")
+    args, _ = parser.parse_known_args()
+    RPC_ADDRESS = args.serve
+    if args.trace:
+        TRACER.enabled = True
+        TRACER.output = (args.trace, args.trace_format)
+        atexit.register(TRACER.dump, args.trace, args.trace_format)
+    ft.app(target=main)
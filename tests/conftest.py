@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main as mm  # noqa: E402
+from bench import synthetic_pack_bytes  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def isolated_caches(tmp_path, monkeypatch):
+    """Per-test pack caches, so nothing is read from or written to the working directory."""
+    monkeypatch.setattr(mm, "_pack_cache", mm.PackInfoCache(lambda: str(tmp_path / "pack_cache.json")))
+    monkeypatch.setattr(mm, "_db_keys_cache", mm.PackInfoCache(lambda: str(tmp_path / "db_keys_cache.json")))
+
+
+@pytest.fixture
+def game(tmp_path):
+    """Game folder with an empty data/; returns (game_path, write_pack(name, files))."""
+    data = tmp_path / "game" / "data"
+    data.mkdir(parents=True)
+
+    def write_pack(name, files):
+        path = data / name
+        path.write_bytes(synthetic_pack_bytes(files))
+        return str(path)
+
+    return str(tmp_path / "game"), write_pack
+
+
+def pack_contents(path):
+    """{entry name: bytes} of a pack."""
+    idx = mm.read_pack_index(path)
+    with open(path, "rb") as f:
+        return {e.name: mm.read_pack_entry(f, idx, e) for e in idx.entries}
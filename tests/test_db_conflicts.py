@@ -0,0 +1,70 @@
+import struct
+
+import pytest
+
+import main as mm
+
+SCHEMA = {"units_tables": {"2": [
+    {"name": "key", "type": "StringU8", "key": True},
+    {"name": "cost", "type": "I32"},
+    {"name": "caption", "type": "OptionalStringU16"},
+]}}
+
+
+def string_u8(text):
+    data = text.encode("utf-8")
+    return struct.pack("<H", len(data)) + data
+
+
+def fragment(rows, version=2):
+    data = (mm.DB_GUID_MARKER + struct.pack("<H", 2) + "ab".encode("utf-16-le")
+            + mm.DB_VERSION_MARKER + struct.pack("<I", version) + b"\x01" + struct.pack("<I", len(rows)))
+    for key, cost, caption in rows:
+        data += string_u8(key) + struct.pack("<i", cost)
+        if caption is None:
+            data += b"\x00"
+        else:
+            data += b"\x01" + struct.pack("<H", len(caption)) + caption.encode("utf-16-le")
+    return data
+
+
+def test_header_and_keys():
+    data = fragment([("unit_a", 100, "Спирит"), ("unit_b", 5, None)])
+    version, _pos, rows = mm.parse_db_header(data)
+    assert (version, rows) == (2, 2)
+    assert mm.read_db_keys(data, SCHEMA["units_tables"]["2"]) == ["unit_a", "unit_b"]
+
+
+def test_composite_key():
+    fields = [dict(f, key=True) if f["name"] in ("key", "cost") else f for f in SCHEMA["units_tables"]["2"]]
+    assert mm.read_db_keys(fragment([("unit_a", 7, None)]), fields) == ["unit_a|7"]
+
+
+def test_schema_mismatch_is_an_error():
+    data = fragment([("unit_a", 1, None)]) + b"trailing"
+    with pytest.raises(ValueError):
+        mm.read_db_keys(data, SCHEMA["units_tables"]["2"])
+
+
+def test_row_conflicts_and_winner(game):
+    game_path, write_pack = game
+    a = write_pack("a.pack", [("db\\units_tables\\a", fragment([("u1", 1, None), ("u2", 2, None)]))])
+    b = write_pack("b.pack", [("db\\units_tables\\b", fragment([("u2", 3, None), ("u3", 4, None)]))])
+
+    analyzer = mm.DbConflictAnalyzer(schema=SCHEMA)
+    report = analyzer.analyze([a, b])
+
+    assert report["conflicts"] == [
+        {"table": "units_tables", "kind": "row", "key": "u2", "mods": ["a.pack", "b.pack"], "winner": "b.pack"}]
+    assert analyzer.analyze([a, b])["recomputed"] == 0
+    assert analyzer.analyze([b, a])["conflicts"][0]["winner"] == "a.pack"
+
+
+def test_unknown_version_falls_back_to_files(game):
+    game_path, write_pack = game
+    a = write_pack("a.pack", [("db\\units_tables\\data__", fragment([("u1", 1, None)], version=9))])
+    b = write_pack("b.pack", [("db\\units_tables\\data__", fragment([("u9", 1, None)], version=9))])
+
+    conflicts = mm.DbConflictAnalyzer(schema=SCHEMA).analyze([a, b])["conflicts"]
+
+    assert [(c["kind"], c["key"], c["winner"]) for c in conflicts] == [("file", "data__", "b.pack")]
@@ -0,0 +1,52 @@
+import os
+import time
+
+import main as mm
+
+
+def touch(path, data=b"x", age=0):
+    with open(path, "wb") as f:
+        f.write(data)
+    if age:
+        then = time.time() - age
+        os.utime(path, (then, then))
+    return str(path)
+
+
+def test_collect_garbage_removes_only_garbage(game, tmp_path):
+    game_path, write_pack = game
+    data = os.path.join(game_path, "data")
+    scripts = tmp_path / "scripts"
+    scripts.mkdir()
+    live = [write_pack("live.pack", [("db/a", b"1")]), write_pack("other.pack", [("db/b", b"2")])]
+    live += [touch(os.path.join(data, "live.png")), touch(os.path.join(data, "other.png"))]
+    live.append(touch(os.path.join(data, "live.pack" + mm.MERGE_MANIFEST_SUFFIX), b"{}"))
+    fresh_part = touch(os.path.join(data, "downloading.pack.part"))   # may still be in use
+    garbage = [
+        touch(os.path.join(data, "gone.png"), b"p" * 10),
+        touch(os.path.join(data, "gone.pack" + mm.MERGE_MANIFEST_SUFFIX), b"{}"),
+        touch(os.path.join(data, "other.pack.part"), b"t" * 100, age=2 * mm.GC_MIN_AGE),
+        touch(scripts / "tmpab12cd34.tmp", b"s", age=2 * mm.GC_MIN_AGE),
+    ]
+    (scripts / "user.script.txt").write_text('mod "live.pack";\nmod "stale.pack";\nmod "other.pack";\n',
+                                             encoding="utf-8")
+
+    report = mm.find_garbage(game_path, str(scripts))
+    assert sorted(p for group in ("previews", "manifests", "temp") for p, _size in report[group]) == sorted(garbage)
+    assert report["script_lines"] == ["stale.pack"]
+
+    freed = mm.collect_garbage(report, game_path, str(scripts))
+    assert freed == report["bytes"] == 10 + 2 + 100 + 1
+    assert not any(os.path.exists(p) for p in garbage)
+    assert all(os.path.exists(p) for p in live + [fresh_part])
+    assert [ln.strip() for ln in mm.read_user_script_lines(str(scripts))] == ['mod "live.pack";', 'mod "other.pack";']
+    assert mm.list_backups(str(scripts))   # user.script was snapshotted before the edit
+
+
+def test_temp_names():
+    assert mm._is_temp_name("tmpab12cd34", False)
+    assert mm._is_temp_name("tmp_x9y8z7w.tmp", False)
+    assert mm._is_temp_name("mod.pack.part", True)
+    assert not mm._is_temp_name("mod.pack.part", False)
+    assert not mm._is_temp_name("tmp_units.pack", True)
+    assert not mm._is_temp_name("template.png", True)
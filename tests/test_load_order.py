@@ -0,0 +1,67 @@
+import random
+
+import pytest
+
+import main as mm
+
+
+def round_trip(old, new):
+    delta = mm.make_order_delta(old, new)
+    assert mm.apply_order_delta(old, delta) == list(new)
+    assert mm.apply_order_delta(new, delta, reverse=True) == list(old)
+    return delta
+
+
+def test_equal_orders_have_no_delta():
+    assert mm.make_order_delta(["a", "b"], ["a", "b"]) is None
+
+
+@pytest.mark.parametrize("new, kind", [
+    (["b", "c", "a", "d"], "move"),
+    (["d", "a", "b", "c"], "move"),
+    (["a", "c"], "remove"),
+    (["x", "a", "b", "y", "c", "d"], "insert"),
+    (["a", "z", "d"], "splice"),
+])
+def test_delta_kinds_round_trip(new, kind):
+    assert round_trip(["a", "b", "c", "d"], new)[0] == kind
+
+
+def test_random_edits_round_trip():
+    rng = random.Random(1234)
+    names = [f"m{i}.pack" for i in range(30)]
+    for _ in range(500):
+        old = rng.sample(names, rng.randint(0, len(names)))
+        new = rng.sample(names, rng.randint(0, len(names)))
+        if rng.random() < 0.5 and old:
+            new = mm.move_mods(old, rng.sample(old, rng.randint(1, len(old))), rng.choice(["top", "bottom", 0]))
+        if old != new:
+            round_trip(old, new)
+
+
+def test_delta_against_a_different_order_is_rejected():
+    delta = mm.make_order_delta(["a", "b", "c"], ["a", "c"])
+    with pytest.raises(ValueError):
+        mm.apply_order_delta(["x", "y"], delta)
+
+
+def test_history_undo_redo():
+    history = mm.OrderHistory()
+    orders = [["a", "b", "c"], ["b", "a", "c"], ["b", "a"], ["b", "a", "d"]]
+    for old, new in zip(orders, orders[1:]):
+        history.record(old, new)
+    current = orders[-1]
+    for expected in reversed(orders[:-1]):
+        current = history.undo(current)
+        assert current == expected
+    assert history.undo(current) is None
+    for expected in orders[1:]:
+        current = history.redo(current)
+        assert current == expected
+
+
+def test_history_clears_when_order_changed_outside():
+    history = mm.OrderHistory()
+    history.record(["a", "b"], ["b", "a"])
+    assert history.undo(["c"]) is None
+    assert not history.can_undo() and not history.can_redo()
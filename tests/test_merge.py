@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+import main as mm
+from conftest import pack_contents
+
+
+def bump_mtime(path):
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def test_later_source_wins(game):
+    game_path, write_pack = game
+    write_pack("a.pack", [("db\\units_tables\\a", b"A" * 8), ("shared\\file", b"from a")])
+    write_pack("b.pack", [("shared\\file", b"from b"), ("script\\b.lua", b"print()")])
+
+    result = mm.merge_packs("merged.pack", ["a.pack", "b.pack"], game_path)
+
+    assert result["mode"] == "rebuilt"
+    merged = os.path.join(game_path, "data", "merged.pack")
+    assert pack_contents(merged) == {
+        "db\\units_tables\\a": b"A" * 8,
+        "shared\\file": b"from b",
+        "script\\b.lua": b"print()",
+    }
+    assert mm.load_merge_manifest(merged)["sources"][1]["name"] == "b.pack"
+
+
+def test_unchanged_sources_are_not_rewritten(game):
+    game_path, write_pack = game
+    write_pack("a.pack", [("x", b"1")])
+    write_pack("b.pack", [("y", b"2")])
+    mm.merge_packs("merged.pack", ["a.pack", "b.pack"], game_path)
+
+    assert mm.merge_packs("merged.pack", ["a.pack", "b.pack"], game_path)["mode"] == "unchanged"
+
+
+def test_same_layout_change_is_patched_in_place(game):
+    game_path, write_pack = game
+    write_pack("a.pack", [("x", b"old a"), ("z", b"zz")])
+    b = write_pack("b.pack", [("x", b"old b"), ("y", b"yy")])
+    mm.merge_packs("merged.pack", ["a.pack", "b.pack"], game_path)
+
+    write_pack("b.pack", [("x", b"new b"), ("y", b"YY")])   # same names and sizes
+    bump_mtime(b)
+    result = mm.merge_packs("merged.pack", ["a.pack", "b.pack"], game_path)
+
+    assert result["mode"] == "patched"
+    merged = os.path.join(game_path, "data", "merged.pack")
+    assert pack_contents(merged) == {"x": b"new b", "z": b"zz", "y": b"YY"}
+
+
+def test_layout_change_rebuilds(game):
+    game_path, write_pack = game
+    write_pack("a.pack", [("x", b"a")])
+    b = write_pack("b.pack", [("y", b"b")])
+    mm.merge_packs("merged.pack", ["a.pack", "b.pack"], game_path)
+
+    write_pack("b.pack", [("y", b"longer"), ("w", b"new")])
+    bump_mtime(b)
+
+    assert mm.merge_packs("merged.pack", ["a.pack", "b.pack"], game_path)["mode"] == "rebuilt"
+    assert pack_contents(os.path.join(game_path, "data", "merged.pack")) == {"x": b"a", "y": b"longer", "w": b"new"}
+
+
+def test_existing_unrelated_pack_is_not_overwritten(game):
+    game_path, write_pack = game
+    write_pack("a.pack", [("x", b"a")])
+    write_pack("b.pack", [("y", b"b")])
+    precious = write_pack("precious.pack", [("keep", b"me")])
+
+    with pytest.raises(FileExistsError):
+        mm.merge_packs("precious.pack", ["a.pack", "b.pack"], game_path)
+    assert pack_contents(precious) == {"keep": b"me"}
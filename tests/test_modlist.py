@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+import main as mm
+
+
+def write_modlist(tmp_path, **fields):
+    data = {"format": mm.MODLIST_FORMAT, "version": mm.MODLIST_VERSION, "mods": []}
+    data.update(fields)
+    path = tmp_path / ("list" + mm.MODLIST_SUFFIX)
+    path.write_text(json.dumps(data), encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("fields", [{"version": "1"}, {"version": None}, {"mods": 3}, {"mods": {"a.pack": 1}}])
+def test_malformed_modlist_is_a_value_error(tmp_path, fields):
+    with pytest.raises(ValueError):
+        mm.read_modlist(write_modlist(tmp_path, **fields))
+
+
+@pytest.mark.parametrize("bad_name", ["../x.pack", "../../outside.pack", "ABSOLUTE"])
+def test_entries_outside_data_are_rejected(game, tmp_path, bad_name):
+    game_path, write_pack = game
+    archive = tmp_path / "archive"
+    archive.mkdir()
+    packed = write_pack("x.pack", [("payload", b"evil")])
+    with open(packed, "rb") as f:
+        content = f.read()
+    (archive / "x.pack").write_bytes(content)
+    if bad_name == "ABSOLUTE":
+        bad_name = str(tmp_path / "outside.pack")
+    entry = {"name": bad_name, "size": len(content), "sha256": mm.file_sha256(packed)}
+    before = sorted(p for p in tmp_path.rglob("*"))
+
+    with pytest.raises(ValueError):
+        mm.import_modlist(write_modlist(tmp_path, mods=[entry]), game_path, str(archive))
+
+    after = sorted(p for p in tmp_path.rglob("*") if not p.name.startswith("list"))
+    assert after == before
+    assert not (tmp_path / "outside.pack").exists()
+    assert not (tmp_path / "game" / "x.pack").exists()
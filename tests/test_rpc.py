@@ -0,0 +1,72 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+import main as mm
+
+
+@pytest.fixture
+def server(tmp_path):
+    methods = {"list": (lambda params: ["a.pack"], False), "disable": (lambda params: "disabled", True)}
+    srv = mm.RpcServer("127.0.0.1:0", methods, token_file=str(tmp_path / "rpc_token.txt")).start()
+    yield srv
+    srv.stop()
+
+
+def exchange(server, *lines):
+    """Send lines on one connection; returns the replies, None for each reply after the server hung up."""
+    async def run():
+        host, port = server.address.rsplit(":", 1)
+        reader, writer = await asyncio.open_connection(host, int(port))
+        replies = []
+        for line in lines:
+            try:
+                writer.write(line.encode("utf-8") + b"\n")
+                await writer.drain()
+                reply = await asyncio.wait_for(reader.readline(), 5)
+            except ConnectionError:
+                reply = b""
+            replies.append(json.loads(reply) if reply else None)
+        writer.close()
+        return replies
+    return asyncio.run(run())
+
+
+def request(method, token=None, request_id=1):
+    req = {"jsonrpc": "2.0", "id": request_id, "method": method}
+    if token is not None:
+        req["token"] = token
+    return json.dumps(req)
+
+
+def test_token_file_is_private(server):
+    assert oct(os.stat(server.token_file).st_mode & 0o777) == oct(0o600)
+
+
+@pytest.mark.parametrize("token", [None, "wrong"])
+def test_missing_or_wrong_token_is_rejected(server, token):
+    reply, after = exchange(server, request("disable", token), request("list", server.token))
+    assert reply["error"]["code"] == mm.RPC_UNAUTHORIZED
+    assert after is None   # connection closed
+
+
+def test_correct_token_succeeds(server):
+    [reply] = exchange(server, request("disable", server.token))
+    assert reply["result"] == "disabled"
+
+
+def test_malformed_line_keeps_an_authenticated_connection(server):
+    first, bad, again = exchange(server, request("list", server.token), "{not json", request("list", server.token, 2))
+    assert first["result"] == ["a.pack"]
+    assert bad["error"]["code"] == mm.RPC_PARSE_ERROR
+    assert again["id"] == 2 and again["result"] == ["a.pack"]
+
+
+def test_http_request_is_dropped_before_any_handler_runs(server):
+    calls = []
+    server.methods["disable"] = (lambda params: calls.append(params), True)
+    reply, after = exchange(server, "POST / HTTP/1.1", request("disable"))
+    assert reply["error"]["code"] == mm.RPC_PARSE_ERROR
+    assert after is None and calls == []
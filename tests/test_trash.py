@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+import main as mm
+from conftest import pack_contents
+
+
+def test_delete_then_restore_gives_back_identical_files(game):
+    game_path, write_pack = game
+    pack = write_pack("mod.pack", [("db/units_tables/u", b"unit" * 50), ("ui/x.png", b"\x89PNG")])
+    png = os.path.join(game_path, "data", "mod.png")
+    with open(png, "wb") as f:
+        f.write(b"preview")
+    with open(pack, "rb") as f:
+        before = f.read()
+
+    entry = mm.delete_mod_files("mod.pack", game_path)
+    assert not os.path.exists(pack) and not os.path.exists(png)
+    [info] = mm.list_trash(game_path)
+    assert info["path"] == entry and info["name"] == "mod.pack" and info["size"] == len(before) + len(b"preview")
+
+    assert mm.restore_trashed_mod(entry, game_path) == png
+    with open(pack, "rb") as f:
+        assert f.read() == before
+    with open(png, "rb") as f:
+        assert f.read() == b"preview"
+    assert pack_contents(pack)["db/units_tables/u"] == b"unit" * 50
+    assert mm.list_trash(game_path) == [] and not os.path.exists(entry)
+
+
+def test_purge_removes_oldest_entries_until_under_the_cap(game):
+    game_path, write_pack = game
+    entries = []
+    for i in range(4):
+        write_pack(f"m{i}.pack", [("db/t", bytes(1000))])
+        entries.append(mm.delete_mod_files(f"m{i}.pack", game_path))
+    size = mm.list_trash(game_path)[0]["size"]
+
+    removed, freed = mm.purge_trash(game_path, max_bytes=2 * size, max_age=3600)
+    assert (removed, freed) == (2, 2 * size)
+    assert [e["path"] for e in mm.list_trash(game_path)] == entries[:1:-1]   # the two newest, newest first
+    assert mm.purge_trash(game_path, max_bytes=2 * size, max_age=3600) == (0, 0)
+
+
+def test_purge_drops_expired_entries_regardless_of_size(game):
+    game_path, write_pack = game
+    write_pack("old.pack", [("db/t", b"x")])
+    mm.delete_mod_files("old.pack", game_path)
+    assert mm.purge_trash(game_path, max_bytes=1 << 30, max_age=-1)[0] == 1
+    assert mm.list_trash(game_path) == []
+
+
+def test_restore_refuses_to_overwrite_a_mod_with_the_same_name(game):
+    game_path, write_pack = game
+    write_pack("mod.pack", [("db/t", b"old")])
+    entry = mm.delete_mod_files("mod.pack", game_path)
+    current = write_pack("mod.pack", [("db/t", b"new")])
+
+    with pytest.raises(FileExistsError):
+        mm.restore_trashed_mod(entry, game_path)
+    assert pack_contents(current) == {"db/t": b"new"}
+    assert pack_contents(os.path.join(entry, "mod.pack")) == {"db/t": b"old"}
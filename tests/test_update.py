@@ -0,0 +1,56 @@
+import os
+
+import main as mm
+
+
+def test_installed_pack_becomes_byte_identical_to_mirror(game):
+    _game_path, write_pack = game
+    installed = write_pack("mod.pack", [
+        ("db\\units_tables\\a", b"A" * 4096),
+        ("script\\old.lua", b"old script"),
+        ("ui\\skin.png", b"P" * 2048),
+    ])
+    mirror = write_pack("mirror.pack", [
+        ("ui\\skin.png", b"P" * 2048),          # unchanged, moved to the front
+        ("db\\units_tables\\a", b"B" * 4096),   # same size, new bytes
+        ("script\\new.lua", b"new script"),
+    ])
+
+    report = mm.update_pack(installed, mirror)
+
+    with open(installed, "rb") as a, open(mirror, "rb") as b:
+        assert a.read() == b.read()
+    assert report["bytes_total"] == os.path.getsize(mirror)
+    assert report["bytes_transferred"] < report["bytes_total"]
+    assert report["added"] == ["script\\new.lua"]
+    assert report["removed"] == ["script\\old.lua"]
+    assert report["modified"] == ["db\\units_tables\\a"]
+
+
+def test_damaged_install_is_replaced_from_mirror(game):
+    _game_path, write_pack = game
+    installed = write_pack("mod.pack", [])
+    with open(installed, "wb") as f:
+        f.write(b"not a pack")
+    mirror = write_pack("mirror.pack", [("x", b"payload")])
+
+    mm.update_pack(installed, mirror)
+
+    with open(installed, "rb") as a, open(mirror, "rb") as b:
+        assert a.read() == b.read()
+
+
+def test_truncated_mirror_pack_keeps_the_install(game, tmp_path):
+    game_path, write_pack = game
+    installed = write_pack("mod.pack", [("x", b"old payload")])
+    before = open(installed, "rb").read()
+    mirror_dir = tmp_path / "mirror"
+    mirror_dir.mkdir()
+    full = write_pack("new.pack", [("x", b"new payload" * 100), ("y", b"more")])
+    with open(full, "rb") as f:
+        (mirror_dir / "mod.pack").write_bytes(f.read()[:-200])   # download cut short
+
+    [report] = mm.update_mods_from_mirror(game_path, str(mirror_dir))
+
+    assert report["status"] == "error" and report["error"]
+    assert open(installed, "rb").read() == before